@@ -0,0 +1,91 @@
+"""Cached activity analysis of audio.
+
+Removing silence, reducing noise, and segmenting audio into clips all start
+from the energy of the signal over time. The per-frame RMS is computed here
+once per audio and set of framing parameters, and memoized by the audio's
+hash, so that the filters and apps in a script share the same analysis.
+"""
+from umdone import segment
+from umdone.tools import cache
+from umdone.sound import Audio
+
+
+def _hash_str(audio):
+    if isinstance(audio, Audio):
+        return audio.hash_str()
+    elif audio.startswith("hash:"):
+        return audio
+    return Audio.from_hash_or_init(audio).hash_str()
+
+
+@cache
+def _frame_rms(h, frame_length, hop_length, center):
+    audio = Audio.from_hash(h)
+    return segment.frame_rms(
+        audio.data, frame_length=frame_length, hop_length=hop_length, center=center
+    )
+
+
+def frame_rms(audio, frame_length=2048, hop_length=512, center=True):
+    """Returns the cached RMS of each frame of audio.
+
+    Parameters
+    ----------
+    audio : Audio or str
+        Audio, a hash string, or a filename.
+    frame_length : int, optional
+        The number of samples per frame.
+    hop_length : int, optional
+        The number of samples between frames.
+    center : bool, optional
+        Whether frames are centered on their samples, see segment.frame_rms().
+
+    Returns
+    -------
+    rms : ndarray
+    """
+    return _frame_rms(_hash_str(audio), frame_length, hop_length, center)
+
+
+def nonsilent_intervals(audio, top_db=60, frame_length=2048, hop_length=512):
+    """Returns the non-silent [start, end) intervals of audio from its cached
+    frame RMS. These are the same as librosa.effects.split() gives.
+    """
+    if not isinstance(audio, Audio):
+        audio = Audio.from_hash_or_init(audio)
+    rms = frame_rms(audio, frame_length=frame_length, hop_length=hop_length)
+    return segment.rms_intervals(
+        rms, len(audio.data), top_db=top_db, hop_length=hop_length
+    )
+
+
+def window_rms(audio, window_length=0.05):
+    """Returns the cached RMS of the whole, non-overlapping windows of audio
+    that are window_length seconds long.
+    """
+    if not isinstance(audio, Audio):
+        audio = Audio.from_hash_or_init(audio)
+    window_size = int(audio.sr * window_length)
+    return frame_rms(
+        audio, frame_length=window_size, hop_length=window_size, center=False
+    )
+
+
+def boundaries(
+    audio, window_length=0.05, threshold=0.01, hysteresis=0.0, min_gap=0.0
+):
+    """Returns the boundaries of the clips of audio where someone is speaking,
+    see segment.boundaries(), from its cached window RMS.
+    """
+    if not isinstance(audio, Audio):
+        audio = Audio.from_hash_or_init(audio)
+    rms = window_rms(audio, window_length=window_length)
+    return segment.boundaries(
+        audio.data,
+        audio.sr,
+        window_length=window_length,
+        threshold=threshold,
+        rms=rms,
+        hysteresis=hysteresis,
+        min_gap=min_gap,
+    )
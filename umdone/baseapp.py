@@ -16,7 +16,7 @@ import umdone.io
 from umdone import cli
 from umdone import dtw
 from umdone import sound
-from umdone import segment
+from umdone import activity
 from umdone.tools import UMDONE_CONFIG_DIR
 
 
@@ -31,7 +31,14 @@ class BaseAppModel(object):
     settings_file = os.path.join(UMDONE_CONFIG_DIR, "baseapp.json")
 
     def __init__(
-        self, audio, window_length=0.05, threshold=0.01, device=-1, dbfile=None
+        self,
+        audio,
+        window_length=0.05,
+        threshold=0.01,
+        device=-1,
+        dbfile=None,
+        hysteresis=0.0,
+        min_gap=0.0,
     ):
         self.dbfile = dbfile
         self.audio = (
@@ -43,6 +50,8 @@ class BaseAppModel(object):
         self.load_settings()
         self.window_length = window_length
         self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.min_gap = min_gap
 
         # sound devices
         if device is None or device >= 0:
@@ -52,8 +61,12 @@ class BaseAppModel(object):
         # data
         self.raw, self.sr = self.audio.data, self.audio.sr
         if self.bounds is None:
-            bounds = segment.boundaries(
-                self.raw, self.sr, window_length=window_length, threshold=threshold
+            bounds = activity.boundaries(
+                self.audio,
+                window_length=window_length,
+                threshold=threshold,
+                hysteresis=hysteresis,
+                min_gap=min_gap,
             )
             self.bounds = bounds[bounds[:, 0] < bounds[:, 1]]
         self.nsegments = len(self.bounds)
@@ -1,5 +1,6 @@
 """Basic audio filters"""
 import sys
+import tempfile
 
 import numpy as np
 
@@ -7,58 +8,157 @@ import librosa.core
 import librosa.util
 import librosa.effects
 
+import umdone.intervals
 from umdone.io import load_clips_file
 from umdone.tools import cache
 from umdone.sound import Audio
+from umdone.intervals import BLOCKSIZE
+from umdone.segment import reflect_range
+from umdone.activity import nonsilent_intervals
 
 
-def complement_intervals(intervals, size=None):
-    """Returns and interval array (2d ndarray) of all intervals
-    complementing the input interval array
-    """
-    inner = np.concatenate(
-        [intervals[:-1, 1, np.newaxis], intervals[1:, 0, np.newaxis]], axis=1
-    )
-    total = []
-    if len(intervals) > 0 and intervals[0, 0] != 0:
-        total.append([[0, intervals[0, 0]]])
-    total.append(inner)
-    if size is not None and len(intervals) > 0 and intervals[-1, 1] != size:
-        total.append([[intervals[-1, 1], size]])
-    if len(total) > 1:
-        comp = np.concatenate(total)
-    else:
-        comp = inner
-    return comp
+# the default number of silent STFT frames that the noise profile is
+# estimated from, about 6 minutes at 22050 Hz
+NOISE_FRAMES = 1 << 14
 
 
-def intervals_to_mask(intervals, size):
-    """Returns numpy boolean mask from intervals array."""
-    mask = np.zeros(size, bool)
-    for start, end in intervals:
-        mask[start : end + 1] = True
-    return mask
+def _stft_frames(get, n, t0, t1, n_fft=2048, hop_length=512):
+    # Computes the centered STFT frames [t0, t1) of a length-n signal, which
+    # is reflected at its edges as librosa.stft() does, where get(lo, hi)
+    # returns its samples [lo, hi).
+    half = n_fft // 2
+    a = t0 * hop_length - half
+    b = (t1 - 1) * hop_length + n_fft - half
+    seg = reflect_range(get, n, a, b)
+    return librosa.stft(seg, n_fft=n_fft, hop_length=hop_length, center=False)
 
 
-@cache
-def _reduce_noise(noisy, sr=None, norm=True):
+def noise_profile(
+    data, silent, n_fft=2048, hop_length=512, chunk_frames=1024, max_frames=None
+):
+    """Estimates the noise profile of audio as the maximum of the STFT frames
+    of its silent samples, chunk by chunk.
+
+    Parameters
+    ----------
+    data : ndarray
+        wav data, may be memory-mapped
+    silent : ndarray
+        N x 2 array of the [start, stop) intervals of the silent samples.
+    n_fft : int, optional
+        FFT window length.
+    hop_length : int, optional
+        Number of samples between successive frames.
+    chunk_frames : int, optional
+        Number of frames to compute at a time.
+    max_frames : int or None, optional
+        Only about this many frames, in chunks spread evenly over the silent
+        samples, are used. None uses all of them.
+
+    Returns
+    -------
+    profile : ndarray or None
+        The complex noise profile of each frequency bin, or None if there are
+        no silent samples.
+    """
+    silent = umdone.intervals.as_intervals(silent)
+    offsets = np.concatenate([[0], np.cumsum(umdone.intervals.lengths(silent))])
+    m = int(offsets[-1])
+    if m == 0:
+        return None
+
+    def get(lo, hi):
+        return umdone.intervals.take_range(data, silent, lo, hi, offsets=offsets)
+
+    n_frames = 1 + m // hop_length
+    chunks = np.arange(0, n_frames, chunk_frames)
+    if max_frames is not None and n_frames > max_frames:
+        k = max(max_frames // chunk_frames, 1)
+        chunks = np.unique(chunks[np.linspace(0, len(chunks) - 1, k).astype(int)])
+    profile = None
+    for t0 in chunks:
+        t1 = min(t0 + chunk_frames, n_frames)
+        D = _stft_frames(get, m, t0, t1, n_fft=n_fft, hop_length=hop_length)
+        # complex maxima are lexicographic, so this reduces like the full max
+        p = np.max(D, axis=1)
+        profile = p if profile is None else np.max([profile, p], axis=0)
+    return profile
+
+
+def iter_reduce_noise(
+    data, profile, n_fft=2048, hop_length=512, blocksize=BLOCKSIZE
+):
+    """Subtracts a noise profile from the STFT of audio and yields the inverse
+    STFT in blocks, computing only the frames that overlap each block. The
+    blocks concatenate to the istft() of the whole subtracted STFT.
+    """
+    n = len(data)
+    half = n_fft // 2
+    n_frames = 1 + n // hop_length
+    length = hop_length * (n_frames - 1)
+    blocksize = max(blocksize // hop_length, 1) * hop_length
+
+    def get(lo, hi):
+        return data[lo:hi]
+
+    for i0 in range(0, length, blocksize):
+        i1 = min(i0 + blocksize, length)
+        # the padded samples [a, b) are covered by the frames [ta, tb)
+        a, b = i0 + half, i1 + half
+        ta = max((a - n_fft) // hop_length + 1, 0)
+        tb = min((b - 1) // hop_length + 1, n_frames)
+        D = _stft_frames(get, n, ta, tb, n_fft=n_fft, hop_length=hop_length)
+        if profile is not None:
+            D = -profile[:, np.newaxis] + D
+        y = librosa.istft(D, n_fft=n_fft, hop_length=hop_length, center=False)
+        yield y[a - ta * hop_length : b - ta * hop_length]
+
+
+def _iter_normalized(blocks, blocksize=BLOCKSIZE):
+    # Normalizes blocks by their maximum absolute value, like
+    # librosa.util.normalize(), by spooling them to a temporary file.
+    with tempfile.TemporaryFile() as f:
+        peak, dtype = 0.0, None
+        for block in blocks:
+            dtype = block.dtype
+            if len(block) > 0:
+                peak = max(peak, np.max(np.abs(block)))
+            block.tofile(f)
+        if dtype is None:
+            return
+        if peak < librosa.util.tiny(np.zeros(1, dtype=dtype)):
+            peak = 1.0
+        peak = dtype.type(peak)
+        f.seek(0)
+        while True:
+            block = np.fromfile(f, dtype=dtype, count=blocksize)
+            if len(block) == 0:
+                break
+            yield block / peak
+
+
+# the block size does not change the result, so it is not part of the key
+@cache(ignore=["blocksize"])
+def _reduce_noise(
+    noisy, sr=None, norm=True, blocksize=BLOCKSIZE, max_noise_frames=NOISE_FRAMES
+):
     noisy = Audio.from_hash_or_init(noisy, sr=sr)
     sr = noisy.sr
-    non_silent_intervals = librosa.effects.split(noisy.data)
-    silent_intervals = complement_intervals(non_silent_intervals, size=len(noisy.data))
-    mask = intervals_to_mask(silent_intervals, len(noisy.data))
-    D_silent = librosa.stft(noisy.data[mask])
-    D_noisy = librosa.stft(noisy.data)
-    D_nr = -np.max(D_silent, axis=1)[:, np.newaxis] + D_noisy
-    nr = librosa.core.istft(D_nr)
-    if norm and np.issubdtype(nr.dtype, np.floating):
-        nr = librosa.util.normalize(nr, norm=np.inf, axis=None)
-    reduced = Audio(nr, sr)
+    n = len(noisy.data)
+    silent = umdone.intervals.complement(nonsilent_intervals(noisy), n)
+    profile = noise_profile(noisy.data, silent, max_frames=max_noise_frames)
+    blocks = iter_reduce_noise(noisy.data, profile, blocksize=blocksize)
+    if norm and np.issubdtype(noisy.data.dtype, np.floating):
+        blocks = _iter_normalized(blocks, blocksize=blocksize)
+    reduced = Audio.from_blocks(blocks, sr)
     return reduced.hash_str()
 
 
-def reduce_noise(noisy, outfile=None, norm=True):
-    """Reduces noise in audio
+def reduce_noise(
+    noisy, outfile=None, norm=True, blocksize=BLOCKSIZE, max_noise_frames=NOISE_FRAMES
+):
+    """Reduces noise in audio, block by block, with memory use that does not
+    depend on the length of the audio.
 
     Parameters
     ----------
@@ -67,6 +167,14 @@ def reduce_noise(noisy, outfile=None, norm=True):
         a file. If this is an Audio instance, it will be used directly.
     outfile : str or None, optional
         Outfile to write the reduced audio to.
+    norm : bool, optional
+        Whether to normalize the output.
+    blocksize : int, optional
+        Number of samples to process at a time.
+    max_noise_frames : int or None, optional
+        Maximum number of silent STFT frames to estimate the noise profile
+        from, None uses all of them. With all of them, the result is that of
+        reduce_noise_full().
 
     Returns
     -------
@@ -74,27 +182,68 @@ def reduce_noise(noisy, outfile=None, norm=True):
     """
     if isinstance(noisy, Audio):
         noisy = noisy.hash_str()
-    reduced = _reduce_noise(noisy, norm=norm)
+    reduced = _reduce_noise(
+        noisy, norm=norm, blocksize=blocksize, max_noise_frames=max_noise_frames
+    )
     reduced = Audio.from_hash(reduced)
     if outfile is not None:
         reduced.save(outfile)
     return reduced
 
 
+def reduce_noise_full(x, norm=True):
+    """Reduces noise in wav data with full STFTs of the whole signal and of all
+    of its silent samples. This is the algorithm that reduce_noise() computes
+    block by block, and it needs several times the memory of the data, so it
+    is only meant as a reference for compare_reduce_noise().
+    """
+    x = np.asarray(x)
+    silent = umdone.intervals.complement(librosa.effects.split(x), len(x))
+    D_nr = librosa.stft(x, pad_mode="reflect")
+    if len(silent) > 0:
+        D_silent = librosa.stft(umdone.intervals.take(x, silent), pad_mode="reflect")
+        D_nr = -np.max(D_silent, axis=1)[:, np.newaxis] + D_nr
+    nr = librosa.istft(D_nr)
+    if norm and np.issubdtype(nr.dtype, np.floating):
+        nr = librosa.util.normalize(nr, norm=np.inf, axis=None)
+    return nr
+
+
+def compare_reduce_noise(noisy, reduced, norm=True):
+    """Compares audio from reduce_noise() to reduce_noise_full() of the noisy
+    audio, which must fit in memory.
+
+    Returns
+    -------
+    max_error : float
+        The maximum absolute difference of the samples.
+    rms_error : float
+        The RMS of the difference, relative to the RMS of the reference.
+    """
+    if not isinstance(noisy, Audio):
+        noisy = Audio.from_hash_or_init(noisy)
+    if not isinstance(reduced, Audio):
+        reduced = Audio.from_hash_or_init(reduced)
+    ref = reduce_noise_full(noisy.data, norm=norm)
+    y = np.asarray(reduced.data)
+    if len(y) != len(ref):
+        raise ValueError(f"lengths differ: {len(y)} != {len(ref)}")
+    diff = y - ref
+    ref_rms = max(np.sqrt(np.mean(ref ** 2)), librosa.util.tiny(ref))
+    return float(np.max(np.abs(diff))), float(np.sqrt(np.mean(diff ** 2)) / ref_rms)
+
+
 @cache
 def _remove_silence(inp, sr=None, reduce_to=0.0):
     inp = Audio.from_hash_or_init(inp, sr=sr)
     sr = inp.sr
-    non_silent_intervals = librosa.effects.split(inp.data)
-    silent_intervals = complement_intervals(non_silent_intervals, size=len(inp.data))
+    n = len(inp.data)
+    silent = umdone.intervals.complement(nonsilent_intervals(inp), n)
     reduce_to_samp = int(reduce_to * sr)
-    long_silences_mask = (
-        silent_intervals[:, 1] - silent_intervals[:, 0]
-    ) > reduce_to_samp
-    long_silences = silent_intervals[long_silences_mask]
-    keep_intervals = complement_intervals(long_silences, size=len(inp.data))
-    mask = intervals_to_mask(keep_intervals, len(inp.data))
-    out = Audio(inp.data[mask], sr)
+    long_silences = silent[umdone.intervals.lengths(silent) > reduce_to_samp]
+    keep = umdone.intervals.complement(long_silences, n)
+    blocks = umdone.intervals.iter_take(inp.data, keep)
+    out = Audio.from_blocks(blocks, sr, dtype=inp.data.dtype)
     return out.hash_str()
 
 
@@ -124,12 +273,12 @@ def remove_silence(inp, reduce_to=0.0):
 
 
 def _remove_marked_clips(inp, bounds, mask):
-    # does the real work
-    keepers = np.ones(inp.data.shape[0], dtype=bool)
-    bad_bounds = bounds[~mask]
-    for start, end in bad_bounds:
-        keepers[start:end+1] = False
-    out = Audio(inp.data[keepers], sr=inp.sr)
+    # does the real work, block by block
+    n = inp.data.shape[0]
+    # the end of each clip's bounds is removed as well
+    bad = umdone.intervals.from_inclusive(bounds[~mask], n)
+    blocks = umdone.intervals.iter_take(inp.data, umdone.intervals.complement(bad, n))
+    out = Audio.from_blocks(blocks, inp.sr, dtype=inp.data.dtype)
     return out
 
 
@@ -188,12 +337,27 @@ def afade(n, base=10, dtype="f4"):
 
 
 def cross_fade_arrays(x, y, n, base=10):
-    """Fades and x-array out while fading a y-array in over n points."""
+    """Fades and x-array out while fading a y-array in over n points. The
+    output is preallocated, and only the overlap is computed.
+    """
     f = afade(n, base=base, dtype=x.dtype)
-    out = np.concatenate([x[:-n], x[-n:] * f[::-1] + y[:n] * f, y[n:]])
+    m = len(x) - n
+    out = np.empty((m + len(y),) + x.shape[1:], dtype=x.dtype)
+    out[:m] = x[:m]
+    overlap = out[m : m + n]
+    np.multiply(x[m:], f[::-1], out=overlap)
+    overlap += y[:n] * f
+    out[m + n :] = y[n:]
     return out
 
 
+def overlap_fade(x, y, base=10):
+    """Returns just the overlap of cross_fade_arrays(), where x is the end of
+    the audio that fades out and y is the start of the audio that fades in.
+    """
+    return cross_fade_arrays(x, y, len(x), base=base)
+
+
 @cache
 def _cross_fade(a, b, sr=None, t=3.0, base=10):
     a = Audio.from_hash_or_init(a, sr=sr)
@@ -201,13 +365,19 @@ def _cross_fade(a, b, sr=None, t=3.0, base=10):
     assert a.sr == b.sr, "sample rates must be equal to cross-fade"
     sr = a.sr
     n = int(t * sr)
-    z = cross_fade_arrays(a.data, b.data, n, base=base)
-    c = Audio(z, sr)
+    na, nb = a.nframes, b.nframes
+    overlap = overlap_fade(a.read(na - n, na), b.read(0, n), base=base)
+    # the rest of a and b are referred to, rather than copied
+    parts = [(a, 0, na - n), Audio(overlap, sr), (b, n, nb)]
+    c = Audio.concat(parts, sr)
     return c.hash_str()
 
 
 def cross_fade(a, b, t=3.0, base=10):
-    """Fades an audio in and another one out simeltaneously over t seconds."""
+    """Fades an audio in and another one out simeltaneously over t seconds.
+    The result is composite audio, see Audio.concat(), so only the overlap is
+    computed and cached.
+    """
     if isinstance(a, Audio):
         a = a.hash_str()
     if isinstance(b, Audio):
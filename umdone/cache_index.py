@@ -0,0 +1,143 @@
+"""A persistent index of the entries in the audio cache.
+
+The index is a small SQLite database in the audio cache directory, which
+records the hash, format, size, sample rate, and last access time of each
+entry. It is shared between processes, while each process keeps a copy of
+the rows in memory, so that membership tests do not have to touch the disk.
+"""
+import os
+import time
+import sqlite3
+from threading import RLock
+
+
+INDEX_FILENAME = "index.sqlite"
+FORMAT_EXTS = {".meta": "npy", ".bz2": "bz2", ".cat": "cat"}
+# access times are only written back when they are at least this stale
+TOUCH_INTERVAL = 60.0
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    fmt TEXT NOT NULL,
+    nbytes INTEGER NOT NULL,
+    sr INTEGER,
+    atime REAL NOT NULL
+)"""
+
+
+def index_filename(cachedir):
+    """The filename of the index for an audio cache directory."""
+    return os.path.join(cachedir, INDEX_FILENAME)
+
+
+class AudioIndex:
+    """The index of an audio cache directory. Rows are (fmt, nbytes, sr, atime)
+    tuples, keyed by hash.
+    """
+
+    def __init__(self, cachedir):
+        self.cachedir = cachedir
+        self.filename = index_filename(cachedir)
+        self.lock = RLock()
+        self.conn = sqlite3.connect(
+            self.filename, timeout=60.0, check_same_thread=False
+        )
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(_SCHEMA)
+        self.rows = {}
+        self.refresh()
+        if not self.rows:
+            self.rebuild()
+
+    def refresh(self):
+        """Reloads all of the rows, including those added by other processes."""
+        with self.lock:
+            cur = self.conn.execute("SELECT key, fmt, nbytes, sr, atime FROM entries")
+            self.rows = {row[0]: row[1:] for row in cur}
+
+    def rebuild(self):
+        """Indexes the complete entries that are in the cache directory, but
+        not in the index, such as those written before the index existed.
+        """
+        added = []
+        for filename in os.listdir(self.cachedir):
+            key, ext = os.path.splitext(filename)
+            if ext not in FORMAT_EXTS or key in self.rows:
+                continue
+            fmt = FORMAT_EXTS[ext]
+            path = os.path.join(self.cachedir, filename)
+            if fmt == "npy":
+                path = os.path.join(self.cachedir, key + ".npy")
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if st.st_size == 0:
+                continue
+            added.append((key, fmt, st.st_size, None, max(st.st_atime, st.st_mtime)))
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?)", added
+            )
+        self.refresh()
+        return len(added)
+
+    def get(self, key):
+        """Returns the row for a key, or None. Keys that have not been seen by
+        this process are looked up in the index on disk.
+        """
+        row = self.rows.get(key, None)
+        if row is None:
+            with self.lock:
+                cur = self.conn.execute(
+                    "SELECT fmt, nbytes, sr, atime FROM entries WHERE key = ?", (key,)
+                )
+                row = cur.fetchone()
+            if row is not None:
+                self.rows[key] = row
+        return row
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        yield from list(self.rows)
+
+    def add(self, key, fmt, nbytes, sr=None):
+        """Adds or replaces the entry for a key."""
+        row = (fmt, int(nbytes), None if sr is None else int(sr), time.time())
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key,) + row
+            )
+        self.rows[key] = row
+
+    def touch(self, key, now=None):
+        """Records that an entry has been accessed."""
+        row = self.rows.get(key, None)
+        now = time.time() if now is None else now
+        if row is None or now - row[3] < TOUCH_INTERVAL:
+            return
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE entries SET atime = ? WHERE key = ?", (now, key))
+        self.rows[key] = row[:3] + (now,)
+
+    def discard(self, keys):
+        """Removes the entries for many keys, if they are present."""
+        if isinstance(keys, str):
+            keys = [keys]
+        keys = list(keys)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM entries WHERE key = ?", [(k,) for k in keys]
+            )
+        for key in keys:
+            self.rows.pop(key, None)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
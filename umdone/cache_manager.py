@@ -0,0 +1,362 @@
+"""Manages the size of the umdone cache directory.
+
+The joblib memory, the audio cache, the AWS transcripts, and the label & clip
+databases all live in $UMDONE_CACHE_DIR. The joblib and audio caches can be
+regenerated, and so they are pruned here, least recently used first, down to
+a size cap and/or a maximum age. Audio that is still referred to by memoized
+function results, or by composite audio, is only evicted after unreferenced
+entries, and evicting it also evicts the entries that refer to it, so that
+nothing is left pointing to missing audio. The databases and transcripts are
+reported, but never removed.
+"""
+import os
+import re
+import json
+import time
+import shutil
+from collections import namedtuple, defaultdict
+
+import numpy as np
+
+from umdone.cache_index import AudioIndex, INDEX_FILENAME
+
+
+AUDIO_CACHE_DIRNAME = "audio-cache"
+JOBLIB_DIRNAME = "joblib"
+# memoized results that refer to audio are small, results that are larger
+# than this are not scanned for references.
+REFERENCE_SCAN_BYTES = 1 << 20
+HASH_RE = re.compile(rb"hash:((?:[a-z0-9]+-)?[0-9a-f]{32})")
+JOBLIB_ENTRY_RE = re.compile(r"^[0-9a-f]{32}$")
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+CacheEntry = namedtuple("CacheEntry", ["kind", "key", "paths", "nbytes", "atime"])
+CacheEntry.__doc__ = """A removable cache entry, either "audio" or "joblib".
+The atime is the most recent time that any of its files were accessed or
+modified."""
+
+
+def parse_age(s):
+    """Parses an age, such as 3600, '90m', '12h', or '7d', into seconds."""
+    if s is None or isinstance(s, (int, float)):
+        return s
+    s = s.strip().lower()
+    unit = s[-1] if s[-1] in AGE_UNITS else "s"
+    return float(s.rstrip(unit)) * AGE_UNITS[unit]
+
+
+def _usage(paths):
+    nbytes, atime = 0, 0.0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        nbytes += st.st_size
+        atime = max(atime, st.st_atime, st.st_mtime)
+    return nbytes, atime
+
+
+def _tree_files(top):
+    for dirpath, _, filenames in os.walk(top):
+        for filename in filenames:
+            yield os.path.join(dirpath, filename)
+
+
+def audio_entries(location):
+    """Finds the entries of the audio cache, grouping the files of each key.
+    Access times that are recorded in the audio cache index are used when
+    they are more recent than those of the files.
+    """
+    cachedir = os.path.join(location, AUDIO_CACHE_DIRNAME)
+    if not os.path.isdir(cachedir):
+        return []
+    files = defaultdict(list)
+    for filename in os.listdir(cachedir):
+        if filename.startswith(INDEX_FILENAME):
+            continue
+        key = filename.split(".", 1)[0]
+        files[key].append(os.path.join(cachedir, filename))
+    index = audio_index(location)
+    entries = []
+    for key, paths in sorted(files.items()):
+        nbytes, atime = _usage(paths)
+        row = index.get(key)
+        if row is not None:
+            atime = max(atime, row[3])
+        entries.append(CacheEntry("audio", key, sorted(paths), nbytes, atime))
+    return entries
+
+
+def audio_index(location):
+    """Opens the audio cache index."""
+    cachedir = os.path.join(location, AUDIO_CACHE_DIRNAME)
+    os.makedirs(cachedir, exist_ok=True)
+    return AudioIndex(cachedir)
+
+
+def joblib_entries(location):
+    """Finds the memoized function results in the joblib cache. The key of
+    each entry is its directory, relative to the joblib cache.
+    """
+    top = os.path.join(location, JOBLIB_DIRNAME)
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(top):
+        if "func_code.py" not in filenames:
+            continue
+        for dirname in sorted(dirnames):
+            if JOBLIB_ENTRY_RE.match(dirname) is None:
+                continue
+            d = os.path.join(dirpath, dirname)
+            paths = sorted(_tree_files(d))
+            nbytes, atime = _usage(paths)
+            key = os.path.relpath(d, top)
+            entries.append(CacheEntry("joblib", key, [d], nbytes, atime))
+    return entries
+
+
+def output_references(entry):
+    """Returns the set of audio hashes that a memoized result, or the segment
+    list of composite audio, refers to.
+    """
+    if entry.kind == "joblib":
+        output = os.path.join(entry.paths[0], "output.pkl")
+    else:
+        cats = [p for p in entry.paths if p.endswith(".cat")]
+        if not cats:
+            return set()
+        output = cats[0]
+    try:
+        if os.stat(output).st_size > REFERENCE_SCAN_BYTES:
+            return set()
+        with open(output, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return set()
+    return {m.decode() for m in HASH_RE.findall(raw)}
+
+
+def references(entries):
+    """Maps audio hashes to the (kind, key) tuples of the joblib and composite
+    audio entries that refer to them.
+    """
+    refs = defaultdict(set)
+    for entry in entries:
+        for h in output_references(entry):
+            refs[h].add((entry.kind, entry.key))
+    return refs
+
+
+def scan(location):
+    """Scans the cache directory.
+
+    Returns
+    -------
+    entries : list of CacheEntry
+        The removable audio and joblib entries.
+    other : dict
+        Maps the other top-level items in the cache directory, which are never
+        removed, to the number of bytes that they use.
+    """
+    entries = audio_entries(location) + joblib_entries(location)
+    other = {}
+    if os.path.isdir(location):
+        for name in sorted(os.listdir(location)):
+            if name in (AUDIO_CACHE_DIRNAME, JOBLIB_DIRNAME):
+                continue
+            path = os.path.join(location, name)
+            paths = list(_tree_files(path)) if os.path.isdir(path) else [path]
+            other[name] = _usage(paths)[0]
+    return entries, other
+
+
+def stats(location):
+    """Returns a dict summarizing the disk usage of the cache directory."""
+    entries, other = scan(location)
+    refs = references(entries)
+    s = {"location": location, "other": other}
+    for kind in ("audio", "joblib"):
+        es = [e for e in entries if e.kind == kind]
+        s[kind] = {
+            "entries": len(es),
+            "nbytes": sum(e.nbytes for e in es),
+            "oldest": min((e.atime for e in es), default=None),
+        }
+    s["audio"]["referenced"] = sum(
+        1 for e in entries if e.kind == "audio" and e.key in refs
+    )
+    s["total_nbytes"] = (
+        s["audio"]["nbytes"] + s["joblib"]["nbytes"] + sum(other.values())
+    )
+    return s
+
+
+def remove(entry, index=None):
+    """Removes the files of a cache entry, and its row in the audio index."""
+    if entry.kind == "audio" and index is not None:
+        index.discard(entry.key)
+    for path in entry.paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def _eviction_order(entries, refs):
+    # unreferenced entries go first, and then referenced audio, each least
+    # recently used first.
+    def key(entry):
+        return (entry.kind == "audio" and bool(refs.get(entry.key)), entry.atime)
+
+    return sorted(entries, key=key)
+
+
+def prune(location, max_bytes=None, max_age=None, now=None, dry_run=False):
+    """Evicts joblib & audio cache entries, least recently used first.
+
+    Parameters
+    ----------
+    location : str
+        The cache directory.
+    max_bytes : int or None, optional
+        Size cap for the whole cache directory, including the files that
+        are never removed.
+    max_age : float or None, optional
+        Entries that have not been used in this many seconds are evicted.
+    now : float or None, optional
+        The current time, defaults to time.time().
+    dry_run : bool, optional
+        Only report what would be removed.
+
+    Returns
+    -------
+    removed : list of CacheEntry
+        The evicted entries, in the order that they were evicted.
+    """
+    now = time.time() if now is None else now
+    entries, other = scan(location)
+    refs = references(entries)
+    by_key = {(e.kind, e.key): e for e in entries}
+    total = sum(e.nbytes for e in entries) + sum(other.values())
+    removed = []
+
+    def evict(entry):
+        nonlocal total
+        if (entry.kind, entry.key) not in by_key:
+            return
+        del by_key[entry.kind, entry.key]
+        total -= entry.nbytes
+        removed.append(entry)
+        for keys in refs.values():
+            keys.discard((entry.kind, entry.key))
+        if entry.kind == "joblib":
+            return
+        # entries that refer to this audio would be left dangling
+        for kind, key in sorted(refs.pop(entry.key, ())):
+            evict(by_key[kind, key])
+
+    if max_age is not None:
+        for entry in _eviction_order(entries, refs):
+            referenced = entry.kind == "audio" and refs.get(entry.key)
+            if now - entry.atime > max_age and not referenced:
+                evict(entry)
+    if max_bytes is not None:
+        for entry in _eviction_order(list(by_key.values()), refs):
+            if total <= max_bytes:
+                break
+            evict(entry)
+    if not dry_run:
+        index = audio_index(location)
+        for entry in removed:
+            remove(entry, index=index)
+    return removed
+
+
+def _verify_audio(entry):
+    exts = {os.path.basename(p).split(".", 1)[-1] for p in entry.paths}
+    problems = []
+    for path in entry.paths:
+        if path.endswith(".tmp"):
+            problems.append((path, "incomplete write"))
+        elif path.endswith(".bz2") and os.path.getsize(path) == 0:
+            problems.append((path, "empty file"))
+    if "meta" in exts and "npy" not in exts:
+        problems.append((entry.paths[0], "metadata without data"))
+    elif "npy" in exts and "meta" not in exts:
+        problems.append((entry.paths[0], "data without metadata"))
+    elif "npy" in exts:
+        npy = [p for p in entry.paths if p.endswith(".npy")][0]
+        try:
+            np.load(npy, mmap_mode="r")
+        except Exception as e:
+            problems.append((npy, "unreadable data: " + str(e)))
+    elif "cat" in exts:
+        cat = [p for p in entry.paths if p.endswith(".cat")][0]
+        try:
+            with open(cat) as f:
+                json.load(f)["segments"]
+        except Exception as e:
+            problems.append((cat, "unreadable segments: " + str(e)))
+    return problems
+
+
+def verify(location, fix=False):
+    """Checks the joblib & audio caches for incomplete or corrupt entries, and
+    for memoized results or composite audio that refer to missing or broken
+    audio.
+
+    Parameters
+    ----------
+    location : str
+        The cache directory.
+    fix : bool, optional
+        Whether to remove the entries that have problems.
+
+    Returns
+    -------
+    problems : list of (CacheEntry, str, str) tuples
+        The entry, the path, and a description of each problem.
+    """
+    entries, _ = scan(location)
+    problems = []
+    good = set()
+    for entry in entries:
+        if entry.kind != "audio":
+            continue
+        ps = _verify_audio(entry)
+        problems.extend((entry, path, msg) for path, msg in ps)
+        if not ps:
+            good.add(entry.key)
+    for entry in entries:
+        if entry.kind != "audio" or entry.key not in good:
+            continue
+        bad = sorted(output_references(entry) - good)
+        if bad:
+            good.discard(entry.key)
+            msg = "refers to missing audio " + bad[0]
+            problems.append((entry, entry.paths[0], msg))
+    for entry in entries:
+        if entry.kind != "joblib":
+            continue
+        output = os.path.join(entry.paths[0], "output.pkl")
+        if not os.path.isfile(output):
+            problems.append((entry, entry.paths[0], "missing output"))
+            continue
+        bad = sorted(output_references(entry) - good)
+        if bad:
+            problems.append((entry, output, "refers to missing audio " + bad[0]))
+    if fix:
+        index = audio_index(location)
+        for entry in {(p[0].kind, p[0].key): p[0] for p in problems}.values():
+            remove(entry, index=index)
+    return problems
+
+
+def format_bytes(n):
+    """Formats a number of bytes for humans."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024:
+            return "{0:.1f} {1}".format(n, unit)
+        n /= 1024
+    return "{0:.1f} TiB".format(n)
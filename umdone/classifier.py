@@ -0,0 +1,148 @@
+"""Pre-trained umm classifiers.
+
+Fitting the support vector classifier on the training distance matrix is
+expensive, so it is done once per set of label databases and the result is
+stored as an artifact next to them. The artifact is keyed by the content
+hashes of the databases (and the DTW parameters), so that it is never used
+with training data that has changed since it was built.
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+import joblib
+from sklearn import svm
+
+import umdone.io
+from umdone import dtw
+
+
+ARTIFACT_VERSION = 1
+SVC_KWARGS = {"gamma": 0.001}
+
+
+def db_hash(fname, blocksize=1 << 20):
+    """Computes the SHA-256 hash of the contents of a database file."""
+    h = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def artifact_key(dbfiles, band=None, band_width=0.1, max_slope=2.0):
+    """Computes the key that identifies the classifier for a list of
+    database files and DTW parameters.
+    """
+    payload = {
+        "version": ARTIFACT_VERSION,
+        "dbs": [db_hash(dbfile) for dbfile in dbfiles],
+        "svc": SVC_KWARGS,
+        "band": band,
+        "band_width": band_width,
+        "max_slope": max_slope,
+    }
+    s = json.dumps(payload, sort_keys=True)
+    return hashlib.sha256(s.encode()).hexdigest()
+
+
+def artifact_filename(dbfiles, key):
+    """The artifact is stored next to the first database file."""
+    d = os.path.dirname(os.path.abspath(dbfiles[0]))
+    return os.path.join(d, "umdone-classifier-" + key[:16] + ".pkl")
+
+
+def _cross_distances(xs, ys, **kwargs):
+    buf = dtw.scratch_buffer(max(map(len, xs + ys), default=0))
+    d = np.empty((len(xs), len(ys)), "f8")
+    for i, x in enumerate(xs):
+        for j, y in enumerate(ys):
+            d[i, j] = dtw.distance(x, y, buf=buf, **kwargs)
+    return d
+
+
+def training_data(dbfiles, band=None, band_width=0.1, max_slope=2.0):
+    """Loads the training data from many database files. Each file only knows
+    the distances between its own mfccs, so the distances between the mfccs
+    of different files are computed here.
+
+    Returns
+    -------
+    mfccs : list of ndarrays
+    distances : ndarray
+        The full distance matrix between all of the mfccs.
+    categories : ndarray
+    """
+    if isinstance(dbfiles, str):
+        dbfiles = [dbfiles]
+    mfccs, blocks, cats = [], [], []
+    for dbfile in dbfiles:
+        m, d, c = umdone.io.load_mfccs_file(dbfile)
+        mfccs.append(m)
+        blocks.append(d)
+        cats.append(c)
+    offsets = np.cumsum([0] + [len(m) for m in mfccs])
+    distances = np.empty((offsets[-1], offsets[-1]), "f8")
+    for a in range(len(dbfiles)):
+        sa = slice(offsets[a], offsets[a + 1])
+        distances[sa, sa] = blocks[a]
+        for b in range(a):
+            sb = slice(offsets[b], offsets[b + 1])
+            cross = _cross_distances(
+                mfccs[a],
+                mfccs[b],
+                band=band,
+                band_width=band_width,
+                max_slope=max_slope,
+            )
+            distances[sa, sb] = cross
+            distances[sb, sa] = cross.T
+    mfccs = [mfcc for m in mfccs for mfcc in m]
+    return mfccs, distances, np.concatenate(cats)
+
+
+def fit(distances, categories):
+    """Fits a support vector classifier to the training distances."""
+    classifier = svm.SVC(**SVC_KWARGS)
+    classifier.fit(distances, categories)
+    return classifier
+
+
+def build(dbfiles, band=None, band_width=0.1, max_slope=2.0, force=False):
+    """Fits the classifier for the database files and stores it as an artifact,
+    if an up-to-date one does not already exist. Returns the artifact filename.
+    """
+    if isinstance(dbfiles, str):
+        dbfiles = [dbfiles]
+    key = artifact_key(dbfiles, band=band, band_width=band_width, max_slope=max_slope)
+    fname = artifact_filename(dbfiles, key)
+    if os.path.isfile(fname) and not force:
+        return fname
+    _, distances, categories = training_data(
+        dbfiles, band=band, band_width=band_width, max_slope=max_slope
+    )
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "key": key,
+        "dbfiles": [os.path.abspath(dbfile) for dbfile in dbfiles],
+        "classifier": fit(distances, categories),
+    }
+    joblib.dump(artifact, fname)
+    return fname
+
+
+def load(dbfiles, band=None, band_width=0.1, max_slope=2.0):
+    """Loads the pre-trained classifier for the database files, or returns None
+    if there is no up-to-date artifact for them.
+    """
+    if isinstance(dbfiles, str):
+        dbfiles = [dbfiles]
+    key = artifact_key(dbfiles, band=band, band_width=band_width, max_slope=max_slope)
+    fname = artifact_filename(dbfiles, key)
+    if not os.path.isfile(fname):
+        return None
+    artifact = joblib.load(fname)
+    if artifact.get("key", None) != key:
+        return None
+    return artifact["classifier"]
@@ -44,6 +44,27 @@ def add_noise_threshold(parser):
     )
 
 
+def add_hysteresis(parser):
+    parser.add_argument(
+        "--hysteresis",
+        dest="hysteresis",
+        default=0.0,
+        type=float,
+        help="Fraction of the noise threshold by which sound must fall below "
+        "it to end a word.",
+    )
+
+
+def add_min_gap(parser):
+    parser.add_argument(
+        "--min-gap",
+        dest="min_gap",
+        default=0.0,
+        type=float,
+        help="Words separated by less quiet than this (in sec) are merged.",
+    )
+
+
 def add_n_mfcc(parser):
     parser.add_argument(
         "--n-mfcc",
@@ -62,3 +83,60 @@ def add_match_threshold(parser):
         help="Threshold distance to match words.",
         type=float,
     )
+
+
+def add_band(parser):
+    parser.add_argument(
+        "--band",
+        dest="band",
+        default=None,
+        choices=["sakoe-chiba", "itakura"],
+        help="Global path constraint for dynamic time warping.",
+    )
+    parser.add_argument(
+        "--band-width",
+        dest="band_width",
+        default=0.1,
+        type=float,
+        help="Radius of the Sakoe-Chiba band, as a fraction of the clip length.",
+    )
+    parser.add_argument(
+        "--max-slope",
+        dest="max_slope",
+        default=2.0,
+        type=float,
+        help="Maximum slope of the Itakura parallelogram.",
+    )
+
+
+def add_classifier(parser):
+    parser.add_argument(
+        "--classifier",
+        dest="classifier",
+        default="svc",
+        choices=["svc", "nearest"],
+        help="How clips are classified, support vector classification or the "
+        "nearest training clip (with pruned DTW searches).",
+    )
+
+
+def add_jobs(parser, default=1, workers="processes"):
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        default=default,
+        type=int,
+        help="Number of worker " + workers + " to use, 0 means one per core.",
+    )
+
+
+def add_mfcc_mode(parser):
+    parser.add_argument(
+        "--mfcc-mode",
+        dest="mfcc_mode",
+        default="clip",
+        choices=["clip", "signal"],
+        help="Compute MFCCs for each clip, or once for the whole signal. "
+        "The label databases must have been built with the same mode.",
+    )
@@ -69,6 +69,8 @@ def add_arguments(parser):
     cli.add_output(parser)
     cli.add_window_length(parser)
     cli.add_noise_threshold(parser)
+    cli.add_hysteresis(parser)
+    cli.add_min_gap(parser)
     cli.add_input(parser)
 
 
@@ -85,6 +87,8 @@ def main(ns=None, args=None):
         ns.output,
         window_length=ns.window_length,
         noise_threshold=ns.noise_threshold,
+        hysteresis=ns.hysteresis,
+        min_gap=ns.min_gap,
     ).main()
 
 
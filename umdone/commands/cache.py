@@ -0,0 +1,146 @@
+"""Reports on, prunes, and verifies the umdone cache directory"""
+import time
+import builtins
+from argparse import ArgumentParser
+
+from lazyasd import lazyobject
+
+from xonsh.tools import print_color
+
+from umdone import cache_manager
+from umdone.tools import MEM
+from umdone.sound import AUDIO_CACHE, parse_bytes
+
+
+@lazyobject
+def PARSER():
+    parser = ArgumentParser("cache")
+    parser.add_argument(
+        "mode",
+        choices=["stats", "prune", "verify"],
+        help="stats reports the disk usage, prune evicts the least recently "
+        "used entries, and verify checks for incomplete or corrupt entries.",
+    )
+    parser.add_argument(
+        "--max-size",
+        dest="max_size",
+        default=None,
+        help="size cap for the cache directory when pruning, such as 20G. "
+        "Defaults to $UMDONE_CACHE_MAX_SIZE.",
+    )
+    parser.add_argument(
+        "--max-age",
+        dest="max_age",
+        default=None,
+        help="evict entries that have not been used in this long when pruning, "
+        "such as 7d or 12h. Defaults to $UMDONE_CACHE_MAX_AGE.",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        default=False,
+        help="only report what would be pruned.",
+    )
+    parser.add_argument(
+        "--fix",
+        dest="fix",
+        action="store_true",
+        default=False,
+        help="remove the entries that fail verification. Do not use while "
+        "another umdone process is writing to the cache.",
+    )
+    return parser
+
+
+def _stats(location, stderr):
+    s = cache_manager.stats(location)
+    print_color("  - location: {GREEN}" + location + "{NO_COLOR}", file=stderr)
+    for kind in ("audio", "joblib"):
+        k = s[kind]
+        line = "  - {0}: {1} entries, {2}".format(
+            kind, k["entries"], cache_manager.format_bytes(k["nbytes"])
+        )
+        if k["oldest"] is not None:
+            days = (time.time() - k["oldest"]) / 86400
+            line += ", oldest used {0:.1f} days ago".format(days)
+        if kind == "audio":
+            line += ", {0} referenced by memoized results".format(k["referenced"])
+        print(line, file=stderr)
+    for name, nbytes in s["other"].items():
+        print(
+            "  - {0}: {1}".format(name, cache_manager.format_bytes(nbytes)),
+            file=stderr,
+        )
+    print(
+        "  - total: " + cache_manager.format_bytes(s["total_nbytes"]), file=stderr
+    )
+    mem = AUDIO_CACHE.stats()
+    print(
+        "  - audio in memory: {0} hits, {1} misses, {2} evictions".format(
+            mem["hits"], mem["misses"], mem["evictions"]
+        ),
+        file=stderr,
+    )
+    return 0
+
+
+def _prune(location, ns, stderr):
+    env = builtins.__xonsh__.env
+    max_size = ns.max_size or env.get("UMDONE_CACHE_MAX_SIZE", None)
+    max_age = ns.max_age or env.get("UMDONE_CACHE_MAX_AGE", None)
+    if max_size is None and max_age is None:
+        print_color(
+            "{RED}Pruning needs --max-size or --max-age!{NO_COLOR}", file=stderr
+        )
+        return 1
+    removed = cache_manager.prune(
+        location,
+        max_bytes=parse_bytes(max_size),
+        max_age=cache_manager.parse_age(max_age),
+        dry_run=ns.dry_run,
+    )
+    verb = "would remove" if ns.dry_run else "removed"
+    for entry in removed:
+        print("  - {0} {1} {2}".format(verb, entry.kind, entry.key), file=stderr)
+        if entry.kind == "audio" and not ns.dry_run:
+            AUDIO_CACHE._forget(entry.key)
+    AUDIO_CACHE.index.refresh()
+    nbytes = sum(e.nbytes for e in removed)
+    msg = "{0} {1} entries, {2}".format(
+        verb, len(removed), cache_manager.format_bytes(nbytes)
+    )
+    print_color("  - {GREEN}" + msg + "{NO_COLOR}", file=stderr)
+    return 0
+
+
+def _verify(location, ns, stderr):
+    problems = cache_manager.verify(location, fix=ns.fix)
+    if ns.fix:
+        for entry, _, _ in problems:
+            AUDIO_CACHE._forget(entry.key)
+        AUDIO_CACHE.index.refresh()
+    for entry, path, msg in problems:
+        print_color(
+            "  - {RED}" + entry.kind + "{NO_COLOR} " + path + ": " + msg, file=stderr
+        )
+    if not problems:
+        print_color("  - {GREEN}no problems found{NO_COLOR}", file=stderr)
+    elif ns.fix:
+        print_color(
+            "  - {GREEN}removed the entries with problems{NO_COLOR}", file=stderr
+        )
+    return 1 if problems and not ns.fix else 0
+
+
+def main(args, stdin=None, stdout=None, stderr=None, spec=None):
+    """Manages the umdone cache directory"""
+    ns = PARSER.parse_args(args)
+    print_color("{YELLOW}Cache " + ns.mode + "{NO_COLOR}", file=stderr, flush=True)
+    location = MEM.location
+    if ns.mode == "stats":
+        return _stats(location, stderr)
+    elif ns.mode == "prune":
+        return _prune(location, ns, stderr)
+    return _verify(location, ns, stderr)
@@ -0,0 +1,128 @@
+"""Condenses training databases into a reduced database of prototypes"""
+import os
+import glob
+from argparse import ArgumentParser
+
+from lazyasd import lazyobject
+
+from xonsh.tools import print_color
+
+from umdone import cli
+from umdone.sound import LABEL_CACHE_DIR
+
+
+@lazyobject
+def PARSER():
+    parser = ArgumentParser("condense-labels")
+    parser.add_argument(
+        "--dbfiles",
+        dest="dbfiles",
+        default=None,
+        nargs="+",
+        help="training database files to load",
+    )
+    cli.add_output(parser)
+    parser.add_argument(
+        "--method",
+        dest="method",
+        default="medoids",
+        choices=["medoids", "cnn"],
+        help="prototype selection method, per-category medoids or a condensed "
+        "nearest neighbor subset",
+    )
+    parser.add_argument(
+        "-k",
+        "--per-category",
+        dest="k",
+        default=8,
+        type=int,
+        help="maximum number of medoids per category",
+    )
+    parser.add_argument(
+        "--test-size",
+        dest="test_size",
+        default=0.2,
+        type=float,
+        help="fraction of labels held out to evaluate the prototypes",
+    )
+    parser.add_argument(
+        "--seed", dest="seed", default=None, type=int, help="random seed"
+    )
+    cli.add_band(parser)
+    return parser
+
+
+def _print_report(report, stderr):
+    print(
+        "  - held-out evaluation ({n_test} labels): {n_prototypes} prototypes of "
+        "{n_train} training labels, {speedup:.1f}x fewer DTW evaluations".format(
+            **report
+        ),
+        file=stderr,
+        flush=True,
+    )
+    for clf in ["nearest", "svc"]:
+        for name in ["full", "prototypes"]:
+            cat, keep = report[name + "_" + clf]
+            print(
+                "    * {0:>7} {1:<10}: {2:.1%} category accuracy, "
+                "{3:.1%} keep/discard accuracy".format(clf, name, cat, keep),
+                file=stderr,
+                flush=True,
+            )
+
+
+def main(args, stdin=None, stdout=None, stderr=None, spec=None):
+    """Condenses training databases into prototypes"""
+    print_color("{YELLOW}Condensing labels{NO_COLOR}", file=stderr, flush=True)
+    ns = PARSER.parse_args(args)
+    # get and verify dbfiles
+    dbfiles = ns.dbfiles
+    if dbfiles is None:
+        dbfiles = sorted(glob.glob(os.path.join(LABEL_CACHE_DIR, "*.h5")))
+    if not dbfiles:
+        print_color(
+            "{RED}No training database files found!{NO_COLOR}", file=stderr, flush=True
+        )
+        return 1
+    if ns.output is None:
+        # not in the label cache dir, so it is not picked up with the full set
+        ns.output = os.path.join(os.path.dirname(LABEL_CACHE_DIR), "prototypes.h5")
+    print(
+        "  - training database files:\n    * " + "\n    * ".join(dbfiles),
+        file=stderr,
+        flush=True,
+    )
+    import umdone.classifier
+    import umdone.prototypes
+
+    dtw_kwargs = dict(band=ns.band, band_width=ns.band_width, max_slope=ns.max_slope)
+    mfccs, distances, categories = umdone.classifier.training_data(
+        dbfiles, **dtw_kwargs
+    )
+    report = umdone.prototypes.evaluate(
+        distances,
+        categories,
+        method=ns.method,
+        k=ns.k,
+        test_size=ns.test_size,
+        seed=ns.seed,
+    )
+    _print_report(report, stderr)
+    idx = umdone.prototypes.select(
+        distances, categories, method=ns.method, k=ns.k, seed=ns.seed
+    )
+    umdone.prototypes.save(ns.output, mfccs, distances, categories, idx)
+    print_color(
+        "  - wrote {0} prototypes to {{GREEN}}{1}{{NO_COLOR}}".format(
+            len(idx), ns.output
+        ),
+        file=stderr,
+        flush=True,
+    )
+    print(
+        "  - run remove-umms --dbfiles " + ns.output + " to use them",
+        file=stderr,
+        flush=True,
+    )
+    return 0
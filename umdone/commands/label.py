@@ -23,7 +23,12 @@ def PARSER():
     )
     cli.add_window_length(parser)
     cli.add_noise_threshold(parser)
+    cli.add_hysteresis(parser)
+    cli.add_min_gap(parser)
     cli.add_n_mfcc(parser)
+    cli.add_band(parser)
+    cli.add_jobs(parser)
+    cli.add_mfcc_mode(parser)
     return parser
 
 
@@ -51,7 +56,14 @@ def main(ain, args, stdin=None, stdout=None, stderr=None, spec=None):
         ns.dbfile,
         window_length=ns.window_length,
         noise_threshold=ns.noise_threshold,
+        hysteresis=ns.hysteresis,
+        min_gap=ns.min_gap,
         n_mfcc=ns.n_mfcc,
+        band=ns.band,
+        band_width=ns.band_width,
+        max_slope=ns.max_slope,
+        jobs=ns.jobs or None,
+        mfcc_mode=ns.mfcc_mode,
     )
     td.main()
     print(f"  - saved label database to {ns.dbfile}", ain, file=stderr)
@@ -6,14 +6,49 @@ from lazyasd import lazyobject
 
 from xonsh.tools import print_color
 
-from umdone.sound import Audio
+from umdone.sound import Audio, LOADERS, DEFAULT_SR
 from umdone.commands import audio_out
 
 
+def _sample_rate(s):
+    return None if s == "native" else int(s)
+
+
 @lazyobject
 def PARSER():
     parser = ArgumentParser("load")
     parser.add_argument("path", help="path to local file or URL.")
+    parser.add_argument(
+        "--sr",
+        dest="sr",
+        type=_sample_rate,
+        default=DEFAULT_SR,
+        help="sample rate to load the audio at, or 'native' to keep the "
+        "sample rate of the file, default " + str(DEFAULT_SR) + ".",
+    )
+    parser.add_argument(
+        "--loader",
+        dest="loader",
+        choices=sorted(LOADERS),
+        default="soundfile",
+        help="library used to decode the file.",
+    )
+    parser.add_argument(
+        "--res-type",
+        dest="res_type",
+        default="kaiser_best",
+        help="resampler quality, such as kaiser_best, kaiser_fast, soxr_hq, "
+        "or soxr_vhq. See librosa.resample().",
+    )
+    parser.add_argument(
+        "--stream",
+        dest="stream",
+        action="store_true",
+        default=False,
+        help="decode a local file block by block into the cache at its native "
+        "sample rate, so that it need not fit in memory. Ignores --sr, "
+        "--loader, and --res-type.",
+    )
     return parser
 
 
@@ -24,6 +59,10 @@ def main(args, stdin=None, stdout=None, stderr=None, spec=None):
     print_color(
         "{YELLOW}Loading {GREEN}" + ns.path + "{NO_COLOR}", file=sys.stderr, flush=True
     )
-    rtn = Audio(ns.path)
+    if ns.stream:
+        rtn = Audio.stream(ns.path)
+    else:
+        rtn = Audio()
+        rtn.load(ns.path, sr=ns.sr, loader=ns.loader, res_type=ns.res_type)
     print("  - loaded", rtn, file=sys.stderr)
     return rtn
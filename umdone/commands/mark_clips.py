@@ -23,6 +23,8 @@ def PARSER():
     )
     cli.add_window_length(parser)
     cli.add_noise_threshold(parser)
+    cli.add_hysteresis(parser)
+    cli.add_min_gap(parser)
     return parser
 
 
@@ -52,6 +54,8 @@ def main(ain, args, stdin=None, stdout=None, stderr=None, spec=None):
         ns.dbfile,
         window_length=ns.window_length,
         noise_threshold=ns.noise_threshold,
+        hysteresis=ns.hysteresis,
+        min_gap=ns.min_gap,
     )
     td.main()
     print(f"  - saved clips database to {ns.dbfile}", ain, file=stderr)
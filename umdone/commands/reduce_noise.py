@@ -7,6 +7,7 @@ from lazyasd import lazyobject
 from xonsh.tools import print_color
 
 from umdone.sound import Audio
+from umdone.intervals import BLOCKSIZE
 from umdone.commands import audio_io
 
 
@@ -24,6 +25,28 @@ def PARSER():
         default=True,
         help="don't normalize output.",
     )
+    parser.add_argument(
+        "--block-size",
+        dest="blocksize",
+        type=int,
+        default=BLOCKSIZE,
+        help="number of samples to process at a time.",
+    )
+    parser.add_argument(
+        "--max-noise-frames",
+        type=int,
+        default=None,
+        help="maximum number of silent frames to estimate the noise from, "
+        "0 means all of them. Defaults to a bounded sample of the silence.",
+    )
+    parser.add_argument(
+        "--check",
+        dest="check",
+        action="store_true",
+        default=False,
+        help="compare the output to the full STFT algorithm, which needs the "
+        "audio to fit in memory several times over.",
+    )
     return parser
 
 
@@ -37,6 +60,24 @@ def main(audio_in, args, stdin=None, stdout=None, stderr=None, spec=None):
     print("  - audio in:", audio_in, file=stderr, flush=True)
     import umdone.basic_filters
 
-    audio_out = umdone.basic_filters.reduce_noise(audio_in, norm=ns.norm)
+    max_noise_frames = ns.max_noise_frames
+    if max_noise_frames is None:
+        max_noise_frames = umdone.basic_filters.NOISE_FRAMES
+    audio_out = umdone.basic_filters.reduce_noise(
+        audio_in,
+        norm=ns.norm,
+        blocksize=ns.blocksize,
+        max_noise_frames=max_noise_frames or None,
+    )
     print("  - audio out:", audio_out, file=stderr, flush=True)
+    if ns.check:
+        max_error, rms_error = umdone.basic_filters.compare_reduce_noise(
+            audio_in, audio_out, norm=ns.norm
+        )
+        print(
+            "  - difference from full STFT: {0:.3g} max, {1:.3g} relative "
+            "RMS".format(max_error, rms_error),
+            file=stderr,
+            flush=True,
+        )
     return audio_out
@@ -28,6 +28,12 @@ def PARSER():
     )
     cli.add_window_length(parser)
     cli.add_noise_threshold(parser)
+    cli.add_hysteresis(parser)
+    cli.add_min_gap(parser)
+    cli.add_band(parser)
+    cli.add_classifier(parser)
+    cli.add_mfcc_mode(parser)
+    cli.add_jobs(parser)
     return parser
 
 
@@ -43,7 +49,7 @@ def main(audio_in, args, stdin=None, stdout=None, stderr=None, spec=None):
     # get and verify dbfiles
     dbfiles = ns.dbfiles
     if dbfiles is None:
-        dbfiles = glob.glob(os.path.join(LABEL_CACHE_DIR, "*.h5"))
+        dbfiles = sorted(glob.glob(os.path.join(LABEL_CACHE_DIR, "*.h5")))
     if not dbfiles:
         print_color(
             "{RED}No training database files found!{NO_COLOR}", file=stderr, flush=True
@@ -64,11 +70,37 @@ def main(audio_in, args, stdin=None, stdout=None, stderr=None, spec=None):
     )
     import umdone.remove_ums
 
+    stats = {}
     audio_out = umdone.remove_ums.remove_umms(
         audio_in,
         dbfiles=dbfiles,
         window_length=ns.window_length,
         noise_threshold=ns.noise_threshold,
+        hysteresis=ns.hysteresis,
+        min_gap=ns.min_gap,
+        band=ns.band,
+        band_width=ns.band_width,
+        max_slope=ns.max_slope,
+        classifier=ns.classifier,
+        mfcc_mode=ns.mfcc_mode,
+        jobs=ns.jobs or None,
+        stats=stats,
     )
+    if stats.get("pretrained", False):
+        print("  - used pre-trained classifier", file=stderr, flush=True)
+    if "candidates" in stats:
+        pruned = stats["pruned_kim"] + stats["pruned_keogh"] + stats["abandoned"]
+        print(
+            "  - pruned {0} of {1} DTW evaluations (LB_Kim: {2}, LB_Keogh: {3}, "
+            "abandoned: {4})".format(
+                pruned,
+                stats["candidates"],
+                stats["pruned_kim"],
+                stats["pruned_keogh"],
+                stats["abandoned"],
+            ),
+            file=stderr,
+            flush=True,
+        )
     print("  - audio out:", audio_out, file=stderr, flush=True)
     return audio_out
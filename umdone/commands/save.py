@@ -1,11 +1,16 @@
 """Save pipeline command"""
+import os
 import sys
+import time
+import traceback
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 
 from lazyasd import lazyobject
 
 from xonsh.tools import print_color, unthreadable, uncapturable
 
+from umdone import cli
 from umdone.sound import Audio
 from umdone.commands import audio_in
 
@@ -20,9 +25,16 @@ def PARSER():
         nargs="+",
         default=(),
     )
+    cli.add_jobs(parser, default=0, workers="threads")
     return parser
 
 
+def _export(audio, outfile):
+    t0 = time.perf_counter()
+    audio.save(outfile)
+    return time.perf_counter() - t0
+
+
 @uncapturable
 @unthreadable
 @audio_in
@@ -36,9 +48,35 @@ def main(ain, args, stdin=None, stdout=None, stderr=None, spec=None):
     else:
         outfiles = ns.files
     print("  - saving audio", ain, file=stderr)
-    for outfile in outfiles:
-        print_color(
-            "  - output: {GREEN}" + outfile + "{NO_COLOR}", file=stderr, flush=True
-        )
-        ain.save(outfile)
-    return 0
+    jobs = min(ns.jobs or os.cpu_count(), max(len(outfiles), 1))
+    t0 = time.perf_counter()
+    status = 0
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_export, ain, outfile) for outfile in outfiles]
+        for outfile, future in zip(outfiles, futures):
+            try:
+                dt = future.result()
+            except Exception as e:
+                print_color(
+                    "  - {RED}failed{NO_COLOR} " + outfile + ": " + str(e),
+                    file=stderr,
+                    flush=True,
+                )
+                traceback.print_exception(type(e), e, e.__traceback__, file=stderr)
+                status = 1
+                continue
+            print_color(
+                "  - output: {GREEN}"
+                + outfile
+                + "{NO_COLOR} in {0:.2f} s".format(dt),
+                file=stderr,
+                flush=True,
+            )
+    print(
+        "  - saved {0} files in {1:.2f} s with {2} threads".format(
+            len(outfiles), time.perf_counter() - t0, jobs
+        ),
+        file=stderr,
+        flush=True,
+    )
+    return status
@@ -0,0 +1,74 @@
+"""Builds the pre-trained classifier for a set of training databases"""
+import os
+import glob
+from argparse import ArgumentParser
+
+from lazyasd import lazyobject
+
+from xonsh.tools import print_color
+
+from umdone import cli
+from umdone.sound import LABEL_CACHE_DIR
+
+
+@lazyobject
+def PARSER():
+    parser = ArgumentParser("train-classifier")
+    parser.add_argument(
+        "--dbfiles",
+        dest="dbfiles",
+        default=None,
+        nargs="+",
+        help="training database files to load",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        dest="force",
+        action="store_true",
+        default=False,
+        help="refit the classifier even if it is up-to-date.",
+    )
+    cli.add_band(parser)
+    return parser
+
+
+def main(args, stdin=None, stdout=None, stderr=None, spec=None):
+    """Fits and stores the classifier used by remove-umms"""
+    print_color("{YELLOW}Training classifier{NO_COLOR}", file=stderr, flush=True)
+    ns = PARSER.parse_args(args)
+    # get and verify dbfiles
+    dbfiles = ns.dbfiles
+    if dbfiles is None:
+        dbfiles = sorted(glob.glob(os.path.join(LABEL_CACHE_DIR, "*.h5")))
+    if not dbfiles:
+        print_color(
+            "{RED}No training database files found!{NO_COLOR}", file=stderr, flush=True
+        )
+        return 1
+    for dbfile in dbfiles:
+        if not os.path.isfile(dbfile):
+            print_color(
+                "{RED}Training database file " + dbfile + " does not exist!{NO_COLOR}",
+                file=stderr,
+                flush=True,
+            )
+            return 1
+    print(
+        "  - training database files:\n    * " + "\n    * ".join(dbfiles),
+        file=stderr,
+        flush=True,
+    )
+    import umdone.classifier
+
+    fname = umdone.classifier.build(
+        dbfiles,
+        band=ns.band,
+        band_width=ns.band_width,
+        max_slope=ns.max_slope,
+        force=ns.force,
+    )
+    print_color(
+        "  - classifier: {GREEN}" + fname + "{NO_COLOR}", file=stderr, flush=True
+    )
+    return 0
@@ -1,21 +1,20 @@
 """Discovery functions."""
 import numpy as np
-import librosa
 from sklearn import svm
 
 from umdone import dtw
+from umdone import features
 
 
-def match(x, sr, bounds, mfccs, distances, categories):
+def match(x, sr, bounds, mfccs, distances, categories, mfcc_mode="clip"):
     """Finds the matches to the training data in x that is in valid the bounds.
     Returns the matched bounds.
     """
     # data setup
     n_mfcc = mfccs[0].shape[1]
     d = np.empty((len(bounds), len(distances)), "f8")
-    for i, (l, u) in enumerate(bounds):
-        clip = x[l:u]
-        clip_mfcc = librosa.feature.mfcc(clip, sr, n_mfcc=n_mfcc).T
+    clips = features.clip_mfccs(x, sr, bounds, n_mfcc=n_mfcc, mode=mfcc_mode)
+    for i, clip_mfcc in enumerate(clips):
         for j, mfcc in enumerate(mfccs):
             d[i, j] = dtw.distance(clip_mfcc, mfcc)
     # learn stuff
@@ -5,15 +5,291 @@
 
 Thanks to the dtw module for inspiration: https://github.com/pierre-rouanet/dtw
 """
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
 
 
+ENGINES = frozenset(["python", "numpy"])
+DEFAULT_ENGINE = "numpy"
+
+BANDS = frozenset(["sakoe-chiba", "itakura"])
+
+# maximum number of elements in the temporary used by pairwise distances
+PAIRWISE_BLOCK_SIZE = 1 << 20
+
+
 def l1(x, y):
     """Computes the L1 norm of two sequences."""
     return np.linalg.norm(x - y, ord=1)
 
 
-def cost_matrix(x, y, dist_func=l1):
+def pairwise_l1(x, y):
+    """Computes the L1 norm between every row of x and every row of y.
+
+    Parameters
+    ----------
+    x : ndarray
+        N1 x M array
+    y : ndarray
+        N2 x M array
+
+    Returns
+    -------
+    dist : N1 x N2 array
+        The local distance matrix.
+    """
+    n1, n2 = len(x), len(y)
+    dist = np.empty((n1, n2), dtype=float)
+    # block over the rows of x so the N1 x N2 x M temporary stays bounded
+    step = max(1, PAIRWISE_BLOCK_SIZE // max(1, n2 * x.shape[1]))
+    for i in range(0, n1, step):
+        diff = x[i : i + step, np.newaxis, :] - y[np.newaxis, :, :]
+        np.abs(diff, out=diff)
+        diff.sum(axis=-1, out=dist[i : i + step])
+    return dist
+
+
+# batched versions of the pointwise distance functions
+PAIRWISE_DIST_FUNCS = {l1: pairwise_l1}
+
+
+def _check_engine(engine):
+    if engine not in ENGINES:
+        raise ValueError(
+            "engine must be one of {0}; got {1!r}".format(
+                ", ".join(sorted(ENGINES)), engine
+            )
+        )
+
+
+def local_distances(x, y, dist_func=l1):
+    """Computes the local distance between every pair of points in two
+    sequences, using the batched version of dist_func if one is available.
+
+    Parameters
+    ----------
+    x : ndarray
+        N1 x M array
+    y : ndarray
+        N2 x M array
+    dist_func : callable, optional
+        Distance function to use in cost evaluation. Default: L1 norm.
+
+    Returns
+    -------
+    dist : N1 x N2 array
+        The local distance matrix.
+    """
+    pairwise = PAIRWISE_DIST_FUNCS.get(dist_func, None)
+    if pairwise is not None:
+        return pairwise(x, y)
+    n1, n2 = len(x), len(y)
+    dist = np.empty((n1, n2), dtype=float)
+    for i in range(n1):
+        for j in range(n2):
+            dist[i, j] = dist_func(x[i], y[j])
+    return dist
+
+
+def _accumulate_python(cost):
+    n1, n2 = cost.shape[0] - 1, cost.shape[1] - 1
+    for i in range(n1):
+        for j in range(n2):
+            cost[i + 1, j + 1] += min(cost[i, j], cost[i, j + 1], cost[i + 1, j])
+
+
+def _accumulate_wavefront(cost):
+    # Every cell on the anti-diagonal i + j = k only depends on cells of the
+    # previous two anti-diagonals, so each diagonal may be updated at once.
+    n1, n2 = cost.shape[0] - 1, cost.shape[1] - 1
+    for k in range(2, n1 + n2 + 1):
+        i = np.arange(max(1, k - n2), min(n1, k - 1) + 1)
+        j = k - i
+        prev = np.minimum(cost[i - 1, j - 1], cost[i - 1, j])
+        np.minimum(prev, cost[i, j - 1], out=prev)
+        cost[i, j] += prev
+
+
+def _check_band(band):
+    if band is not None and band not in BANDS:
+        raise ValueError(
+            "band must be None or one of {0}; got {1!r}".format(
+                ", ".join(sorted(BANDS)), band
+            )
+        )
+
+
+def _repair_band(lo, hi, n2):
+    # make sure that the band is non-empty and contains at least one warp path
+    lo[0] = 0
+    hi[-1] = n2
+    lo = np.maximum.accumulate(np.clip(lo, 0, n2 - 1))
+    hi = np.maximum(np.clip(hi, 1, n2), lo + 1)
+    hi[:-1] = np.maximum(hi[:-1], lo[1:])
+    hi = np.maximum.accumulate(hi)
+    return lo, hi
+
+
+def band_limits(n1, n2, band=None, band_width=0.1, max_slope=2.0):
+    """Computes the global path constraint of a DTW cost matrix.
+
+    Parameters
+    ----------
+    n1 : int
+        Length of the first sequence.
+    n2 : int
+        Length of the second sequence.
+    band : str or None, optional
+        The global constraint, either "sakoe-chiba", "itakura", or None for
+        no constraint.
+    band_width : float, optional
+        Radius of the Sakoe-Chiba band, as a fraction of the longer sequence.
+    max_slope : float, optional
+        Maximum slope of the Itakura parallelogram.
+
+    Returns
+    -------
+    lo : int ndarray
+        Length-N1 array of the first column in the band on each row.
+    hi : int ndarray
+        Length-N1 array of one past the last column in the band on each row.
+    """
+    _check_band(band)
+    lo = np.zeros(n1, dtype=int)
+    hi = np.full(n1, n2, dtype=int)
+    if band is None or n1 == 1 or n2 == 1:
+        return lo, hi
+    i = np.arange(n1)
+    if band == "sakoe-chiba":
+        slope = (n2 - 1) / (n1 - 1)
+        radius = max(band_width * max(n1, n2), slope)
+        center = i * slope
+        lo = np.ceil(center - radius).astype(int)
+        hi = np.floor(center + radius).astype(int) + 1
+    else:
+        # the slope must allow the diagonal between the corners at the very least
+        s = max(max_slope, (n2 - 1) / (n1 - 1), (n1 - 1) / (n2 - 1))
+        k = (n1 - 1) - i
+        lo = np.ceil(np.maximum(i / s, (n2 - 1) - k * s)).astype(int)
+        hi = np.floor(np.minimum(i * s, (n2 - 1) - k / s)).astype(int) + 1
+    return _repair_band(lo, hi, n2)
+
+
+def _band_slice(row, lo, hi, start, stop):
+    # gets row[start:stop] of a banded row that spans [lo, hi), inf elsewhere
+    out = np.full(stop - start, np.inf)
+    a, b = max(lo, start), min(hi, stop)
+    if a < b:
+        out[a - start : b - start] = row[a - lo : b - lo]
+    return out
+
+
+def _band_rows(x, y, lo, hi, dist_func=l1, engine=DEFAULT_ENGINE):
+    # Yields the accumulated cost of each row of the cost matrix, restricted
+    # to the columns [lo[i], hi[i]). Only the previous row is kept around.
+    # The virtual row before the first only holds the origin, at column -1.
+    prev, plo, phi = np.zeros(1), -1, 0
+    for i in range(len(x)):
+        l, h = lo[i], hi[i]
+        d = local_distances(x[i : i + 1], y[l:h], dist_func=dist_func)[0]
+        up = _band_slice(prev, plo, phi, l, h)
+        diag = _band_slice(prev, plo, phi, l - 1, h - 1)
+        t = d + np.minimum(up, diag)
+        if engine == "python":
+            row = t
+            for j in range(1, h - l):
+                row[j] = min(t[j], d[j] + row[j - 1])
+        else:
+            # c[j] = min(t[j], d[j] + c[j-1]) is the same as
+            # c[j] = S[j] + min_{k <= j}(t[k] - S[k]), where S = cumsum(d)
+            s = np.cumsum(d)
+            row = np.minimum.accumulate(t - s)
+            row += s
+        yield i, l, h, row
+        prev, plo, phi = row, l, h
+
+
+def _transpose_band(lo, hi, n2):
+    # bands are monotonic, so each column of the band is a contiguous run of rows
+    j = np.arange(n2)
+    return np.searchsorted(hi, j, side="right"), np.searchsorted(lo, j, side="right")
+
+
+def scratch_buffer(n):
+    """Allocates scratch space for distance() that is large enough for
+    any pair of sequences where the shorter one has at most n points.
+    """
+    return np.full((2, n + 1), np.inf)
+
+
+def _rolling_distance(
+    x,
+    y,
+    lo,
+    hi,
+    dist_func=l1,
+    engine=DEFAULT_ENGINE,
+    buf=None,
+    abandon=np.inf,
+    tail=None,
+):
+    # Computes the accumulated cost of the last cell while only keeping two
+    # rows of the cost matrix. The rows are padded by one column on the left,
+    # so that padded column J is sequence column J - 1. Outside of the band
+    # the buffer rows always hold inf, except for the origin.
+    # Every warp path crosses every row, so as soon as the cheapest cell in a
+    # row (plus a lower bound on the remaining rows, tail) exceeds abandon the
+    # final cost must too, and inf is returned early.
+    n2 = len(y)
+    rtn = None
+    if buf is None or buf.shape[1] < n2 + 1:
+        buf = scratch_buffer(n2)
+    prev, cur = buf[0], buf[1]
+    prev[0] = 0.0
+    pa, pb, ca, cb = 0, 1, 0, 0
+    for i in range(len(x)):
+        l, h = lo[i], hi[i]
+        cur[ca:cb] = np.inf
+        if engine == "python":
+            for j in range(l, h):
+                cur[j + 1] = dist_func(x[i], y[j]) + min(prev[j], prev[j + 1], cur[j])
+        else:
+            d = local_distances(x[i : i + 1], y[l:h], dist_func=dist_func)[0]
+            t = np.minimum(prev[l:h], prev[l + 1 : h + 1])
+            t += d
+            s = np.cumsum(d, out=d)
+            t -= s
+            row = cur[l + 1 : h + 1]
+            np.minimum.accumulate(t, out=row)
+            row += s
+        ca, cb = l + 1, h + 1
+        prev, cur, pa, pb, ca, cb = cur, prev, ca, cb, pa, pb
+        if abandon < np.inf:
+            bound = prev[pa:pb].min()
+            if tail is not None:
+                bound += tail[i]
+            if bound > abandon:
+                rtn = np.inf
+                break
+    if rtn is None:
+        rtn = prev[n2]
+    # leave the buffer clean for the next call
+    prev[pa:pb] = np.inf
+    cur[ca:cb] = np.inf
+    return rtn
+
+
+def cost_matrix(
+    x,
+    y,
+    dist_func=l1,
+    engine=DEFAULT_ENGINE,
+    band=None,
+    band_width=0.1,
+    max_slope=2.0,
+):
     """Computes the DTW cost matrix given two sequences.
 
     Parameters
@@ -24,35 +300,71 @@ def cost_matrix(x, y, dist_func=l1):
         N2 x M array
     dist_func : callable, optional
         Distance function to use in cost evaluation. Default: L1 norm.
+    engine : str, optional
+        How the matrix is computed, either "numpy" for batched local distances
+        and a vectorized anti-diagonal accumulation, or "python" for the
+        reference nested loops. Default: "numpy".
+    band : str or None, optional
+        Global path constraint, "sakoe-chiba", "itakura", or None.
+        Cells outside of the band are never computed and are set to inf.
+    band_width : float, optional
+        Radius of the Sakoe-Chiba band, as a fraction of the longer sequence.
+    max_slope : float, optional
+        Maximum slope of the Itakura parallelogram.
 
     Returns
     -------
     cost : N1 x N2 array
         The accumulated cost matrix.
     """
+    _check_engine(engine)
     x = np.atleast_2d(x)
     n1 = len(x)
     y = np.atleast_2d(y)
     n2 = len(y)
 
+    if band is not None:
+        lo, hi = band_limits(
+            n1, n2, band=band, band_width=band_width, max_slope=max_slope
+        )
+        cost = np.full((n1, n2), np.inf)
+        rows = _band_rows(x, y, lo, hi, dist_func=dist_func, engine=engine)
+        for i, l, h, row in rows:
+            cost[i, l:h] = row
+        return cost
+
     cost = np.empty((n1 + 1, n2 + 1), dtype=float)
+    cost[0, 0] = 0.0
     cost[0, 1:] = np.inf
     cost[1:, 0] = np.inf
 
-    for i in range(n1):
-        for j in range(n2):
-            cost[i + 1, j + 1] = dist_func(x[i], y[j])
-
-    for i in range(n1):
-        for j in range(n2):
-            cost[i + 1, j + 1] += min(cost[i, j], cost[i, j + 1], cost[i + 1, j])
+    if engine == "python":
+        for i in range(n1):
+            for j in range(n2):
+                cost[i + 1, j + 1] = dist_func(x[i], y[j])
+        _accumulate_python(cost)
+    else:
+        cost[1:, 1:] = local_distances(x, y, dist_func=dist_func)
+        _accumulate_wavefront(cost)
 
     cost = cost[1:, 1:]
     return cost
 
 
-def distance(x=None, y=None, cost=None, dist_func=l1):
+def distance(
+    x=None,
+    y=None,
+    cost=None,
+    dist_func=l1,
+    engine=DEFAULT_ENGINE,
+    band=None,
+    band_width=0.1,
+    max_slope=2.0,
+    buf=None,
+):
     """Computes the DTW distance given either two sequences or a cost matrix.
+    When only the sequences are given, just two rows of the cost matrix are
+    ever held in memory.
 
     Parameters
     ----------
@@ -64,6 +376,18 @@ def distance(x=None, y=None, cost=None, dist_func=l1):
         The accumulated cost matrix.
     dist_func : callable, optional
         Distance function to use in cost evaluation. Default: L1 norm.
+    engine : str, optional
+        Engine used to compute the cost matrix, see cost_matrix().
+    band : str or None, optional
+        Global path constraint, "sakoe-chiba", "itakura", or None.
+        Only the cells inside of the band are computed and stored.
+    band_width : float, optional
+        Radius of the Sakoe-Chiba band, as a fraction of the longer sequence.
+    max_slope : float, optional
+        Maximum slope of the Itakura parallelogram.
+    buf : 2 x K float ndarray, optional
+        Scratch space to reuse across many calls, see scratch_buffer().
+        This must have at least min(N1, N2) + 1 columns to be used.
 
     Returns
     -------
@@ -73,7 +397,20 @@ def distance(x=None, y=None, cost=None, dist_func=l1):
     if cost is None:
         if x is None or y is None:
             raise ValueError("x & y cannont be None if cost is None!")
-        cost = cost_matrix(x, y, dist_func=dist_func)
+        _check_engine(engine)
+        x = np.atleast_2d(x)
+        y = np.atleast_2d(y)
+        n1, n2 = len(x), len(y)
+        lo, hi = band_limits(
+            n1, n2, band=band, band_width=band_width, max_slope=max_slope
+        )
+        # the pairwise distance functions are all symmetric, so the rows may
+        # run over the longer sequence in order to keep the buffer short.
+        if n2 > n1 and dist_func in PAIRWISE_DIST_FUNCS:
+            lo, hi = _transpose_band(lo, hi, n2)
+            x, y = y, x
+        c = _rolling_distance(x, y, lo, hi, dist_func=dist_func, engine=engine, buf=buf)
+        return c / (n1 + n2)
     return cost[-1, -1] / np.sum(cost.shape)
 
 
@@ -108,7 +445,9 @@ def warp_path(cost):
     return np.array([p[::-1], q[::-1]])
 
 
-def dtw(x, y, dist_func=l1):
+def dtw(
+    x, y, dist_func=l1, engine=DEFAULT_ENGINE, band=None, band_width=0.1, max_slope=2.0
+):
     """Calculates the dynamic time warping of two sequences.
 
     Parameters
@@ -119,6 +458,14 @@ def dtw(x, y, dist_func=l1):
         N2 x M array
     dist_func : callable, optional
         Distance function to use in cost evaluation. Default: L1 norm.
+    engine : str, optional
+        Engine used to compute the cost matrix, see cost_matrix().
+    band : str or None, optional
+        Global path constraint, "sakoe-chiba", "itakura", or None.
+    band_width : float, optional
+        Radius of the Sakoe-Chiba band, as a fraction of the longer sequence.
+    max_slope : float, optional
+        Maximum slope of the Itakura parallelogram.
 
     Returns
     -------
@@ -129,23 +476,309 @@ def dtw(x, y, dist_func=l1):
     w : M x 2 array
         The warp path.
     """
-    cost = cost_matrix(x, y, dist_func=l1)
+    cost = cost_matrix(
+        x,
+        y,
+        dist_func=dist_func,
+        engine=engine,
+        band=band,
+        band_width=band_width,
+        max_slope=max_slope,
+    )
     d = distance(cost=cost)
     w = warp_path(cost)
     return d, cost, w
 
 
-def distance_matrix(mfccs, callback=None):
-    """Computes a distance matrix from a list mfccs"""
+def _distance_tile(rows, cols, diagonal, kwargs):
+    # computes a tile of the distance matrix in a worker, for diagonal tiles
+    # only the lower triangle is filled in.
+    buf = scratch_buffer(max(map(len, rows + cols), default=0))
+    tile = np.empty((len(rows), len(cols)), "f8")
+    for i, x in enumerate(rows):
+        for j in range(i + 1 if diagonal else len(cols)):
+            tile[i, j] = distance(x, cols[j], buf=buf, **kwargs)
+    return tile
+
+
+def _distance_matrix_parallel(mfccs, dists, start, callback, jobs, tile_size, kwargs):
     n = len(mfccs)
     stat_numer = 0.0
-    stat_denom = (n ** 2) / 2
-    dists = np.empty((n, n), "f8")
-    for i in range(n):
-        for j in range(i, n):
-            # this matrix is symmetric by def.
-            dists[i, j] = dists[j, i] = distance(mfccs[i], mfccs[j])
+    stat_denom = (n * (n + 1) - start * (start + 1)) / 2
+    # the old columns are tiled separately, so that the new columns line up
+    # with the row tiles.
+    col_starts = list(range(0, start, tile_size)) + list(range(start, n, tile_size))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for i in range(start, n, tile_size):
+            for j in col_starts:
+                if j > i:
+                    break
+                rows = mfccs[i : i + tile_size]
+                cols = mfccs[j : min(j + tile_size, start if j < start else n)]
+                future = executor.submit(_distance_tile, rows, cols, i == j, kwargs)
+                futures[future] = (i, j)
+        for future in as_completed(futures):
+            i, j = futures[future]
+            tile = future.result()
+            ni, nj = tile.shape
+            r = i - start
+            if i == j:
+                lower = np.tril_indices(ni)
+                dists[r + lower[0], j + lower[1]] = tile[lower]
+                dists[r + lower[1], j + lower[0]] = tile[lower]
+                stat_numer += ni * (ni + 1) / 2
+            else:
+                dists[r : r + ni, j : j + nj] = tile
+                if j >= start:
+                    dists[j - start : j - start + nj, i : i + ni] = tile.T
+                stat_numer += ni * nj
+            if callback is not None:
+                callback(stat_numer / stat_denom)
+
+
+def distance_matrix(
+    mfccs,
+    callback=None,
+    engine=DEFAULT_ENGINE,
+    band=None,
+    band_width=0.1,
+    max_slope=2.0,
+    jobs=1,
+    tile_size=64,
+    start=0,
+):
+    """Computes a distance matrix from a list mfccs. The callback, if given, is
+    called with the fraction of the matrix that has been computed so far.
+
+    When jobs is not 1, the matrix is split into tile_size x tile_size
+    tiles that are computed on a pool of jobs processes; None means one
+    process per core.
+
+    If start is given, the distances between the first start mfccs are
+    assumed to be known already. Only the last n - start rows of the matrix,
+    the distances from mfccs[start:] to all of the mfccs, are computed and
+    returned as an (n - start) x n array.
+    """
+    mfccs = list(mfccs)
+    n = len(mfccs)
+    dists = np.empty((n - start, n), "f8")
+    kwargs = dict(engine=engine, band=band, band_width=band_width, max_slope=max_slope)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs != 1 and n - start > tile_size:
+        _distance_matrix_parallel(
+            mfccs, dists, start, callback, jobs, tile_size, kwargs
+        )
+        return dists
+    buf = scratch_buffer(max(map(len, mfccs), default=0))
+    stat_numer = 0.0
+    stat_denom = (n * (n + 1) - start * (start + 1)) / 2
+    for i in range(start, n):
+        for j in range(i + 1):
+            d = distance(mfccs[i], mfccs[j], buf=buf, **kwargs)
+            dists[i - start, j] = d
+            if j >= start:
+                # this matrix is symmetric by def.
+                dists[j - start, i] = d
             if callback is not None:
                 stat_numer += 1.0
                 callback(stat_numer / stat_denom)
     return dists
+
+
+def _range_table(y, func):
+    # sparse table of func over all power-of-two runs of y, for O(1) range queries
+    levels = [y]
+    width = 1
+    while 2 * width <= len(y):
+        prev = levels[-1]
+        levels.append(func(prev[: len(prev) - width], prev[width:]))
+        width *= 2
+    table = np.empty((len(levels),) + y.shape, dtype=float)
+    for k, level in enumerate(levels):
+        table[k, : len(level)] = level
+        table[k, len(level) :] = np.nan
+    return table
+
+
+def _range_query(table, lo, hi, func):
+    k = np.floor(np.log2(hi - lo)).astype(int)
+    return func(table[k, lo], table[k, hi - (1 << k)])
+
+
+def lb_kim(x, y):
+    """Computes the LB_Kim lower bound of the (unnormalized) L1 DTW cost
+    between two sequences. Every warp path starts at the first points and
+    ends at the last points, so their distances bound the cost from below.
+    """
+    lb = l1(x[0], y[0])
+    if len(x) > 1 or len(y) > 1:
+        lb += l1(x[-1], y[-1])
+    return lb
+
+
+def lb_keogh(x, upper, lower):
+    """Computes the LB_Keogh lower bound of the (unnormalized) L1 DTW cost,
+    given the upper and lower envelopes of the other sequence.
+
+    Parameters
+    ----------
+    x : ndarray
+        N1 x M array
+    upper : ndarray
+        N1 x M array, the maximum of the other sequence over the part
+        of the band in each row.
+    lower : ndarray
+        N1 x M array, the minimum of the other sequence over the part
+        of the band in each row.
+
+    Returns
+    -------
+    lb : N1 array
+        The lower bound contribution of each row.
+    """
+    above = x - upper
+    np.maximum(above, 0.0, out=above)
+    below = lower - x
+    np.maximum(below, 0.0, out=below)
+    above += below
+    return above.sum(axis=1)
+
+
+class TemplateIndex(object):
+    """Nearest neighbor search of a query sequence among many templates
+    under the normalized L1 DTW distance of distance(). A cascade of cheap
+    lower bounds, LB_Kim then LB_Keogh, skips templates that cannot be nearer
+    than the best one found so far, and the remaining DTW computations are
+    abandoned as soon as they are certain to be farther.
+
+    The statistics of the searches are kept in the stats dict, with the
+    following keys: "searches", "candidates", "pruned_kim", "pruned_keogh",
+    "abandoned", and "computed".
+    """
+
+    def __init__(
+        self,
+        templates,
+        engine=DEFAULT_ENGINE,
+        band=None,
+        band_width=0.1,
+        max_slope=2.0,
+    ):
+        """
+        Parameters
+        ----------
+        templates : list of ndarrays
+            The N_i x M template sequences.
+        engine : str, optional
+            Engine used for the DTW computations, see cost_matrix().
+        band : str or None, optional
+            Global path constraint, "sakoe-chiba", "itakura", or None.
+        band_width : float, optional
+            Radius of the Sakoe-Chiba band, as a fraction of the longer sequence.
+        max_slope : float, optional
+            Maximum slope of the Itakura parallelogram.
+        """
+        _check_engine(engine)
+        _check_band(band)
+        self.templates = [np.atleast_2d(t) for t in templates]
+        self.engine = engine
+        self.band = band
+        self.band_width = band_width
+        self.max_slope = max_slope
+        # precomputed envelopes, which can answer the max and min of any run
+        self._upper = [_range_table(t, np.maximum) for t in self.templates]
+        self._lower = [_range_table(t, np.minimum) for t in self.templates]
+        self._firsts = np.array([t[0] for t in self.templates])
+        self._lasts = np.array([t[-1] for t in self.templates])
+        self._lens = np.array([len(t) for t in self.templates])
+        self._buf = scratch_buffer(max(self._lens, default=0))
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.templates)
+
+    def reset_stats(self):
+        """Zeros out the search statistics."""
+        keys = [
+            "searches",
+            "candidates",
+            "pruned_kim",
+            "pruned_keogh",
+            "abandoned",
+            "computed",
+        ]
+        self.stats = dict.fromkeys(keys, 0)
+
+    @property
+    def pruned(self):
+        """The number of full DTW evaluations that were avoided."""
+        s = self.stats
+        return s["pruned_kim"] + s["pruned_keogh"] + s["abandoned"]
+
+    def _band_limits(self, n1, n2):
+        return band_limits(
+            n1, n2, band=self.band, band_width=self.band_width, max_slope=self.max_slope
+        )
+
+    def nearest(self, x):
+        """Finds the template nearest to a query sequence.
+
+        Parameters
+        ----------
+        x : ndarray
+            N1 x M query sequence.
+
+        Returns
+        -------
+        idx : int
+            The index of the nearest template.
+        d : float
+            The DTW distance to the nearest template.
+        """
+        x = np.atleast_2d(x)
+        n1 = len(x)
+        stats = self.stats
+        stats["searches"] += 1
+        stats["candidates"] += len(self)
+        norms = n1 + self._lens
+        # LB_Kim for all templates at once, visiting the most promising first
+        kim = np.abs(self._firsts - x[0]).sum(axis=1)
+        lasts = np.abs(self._lasts - x[-1]).sum(axis=1)
+        kim += np.where((n1 > 1) | (self._lens > 1), lasts, 0.0)
+        kim /= norms
+        best, best_idx = np.inf, -1
+        for j in np.argsort(kim, kind="stable"):
+            if kim[j] >= best:
+                stats["pruned_kim"] += 1
+                continue
+            lo, hi = self._band_limits(n1, self._lens[j])
+            upper = _range_query(self._upper[j], lo, hi, np.maximum)
+            lower = _range_query(self._lower[j], lo, hi, np.minimum)
+            rows = lb_keogh(x, upper, lower)
+            if rows.sum() / norms[j] >= best:
+                stats["pruned_keogh"] += 1
+                continue
+            # lower bound of the rows that have not yet been accumulated
+            tail = np.cumsum(rows[::-1])[::-1]
+            tail[:-1] = tail[1:]
+            tail[-1] = 0.0
+            c = _rolling_distance(
+                x,
+                self.templates[j],
+                lo,
+                hi,
+                engine=self.engine,
+                buf=self._buf,
+                abandon=best * norms[j],
+                tail=tail,
+            )
+            if np.isinf(c):
+                stats["abandoned"] += 1
+                continue
+            stats["computed"] += 1
+            d = c / norms[j]
+            if d < best:
+                best, best_idx = d, j
+        return best_idx, best
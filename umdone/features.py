@@ -0,0 +1,165 @@
+"""Feature extraction for umdone.
+
+The MFCCs of the clips of a signal may be computed in one of two modes. In
+"clip" mode, which the label databases have always used, each clip is passed
+to librosa on its own. In "signal" mode, the MFCCs are computed for the whole
+signal, in large chunks, and each clip's features are a view of the frames
+that it covers. This avoids repeating the STFT setup thousands of times per
+episode, but the features are not the same as in "clip" mode: the edge frames
+of a clip see the neighboring audio rather than reflected padding, and since
+librosa clips the decibel scale to 80 dB below the loudest frame of each call,
+the floor of every frame depends on the chunk (or clip) it was computed in.
+So training and inference must use the same mode.
+"""
+import numpy as np
+
+import librosa
+
+from umdone import segment
+
+
+MFCC_MODES = frozenset(["signal", "clip"])
+
+
+def frame_bounds(bounds, hop_length=512):
+    """Maps sample bounds to MFCC frame bounds.
+
+    Parameters
+    ----------
+    bounds : ndarray
+        N x 2 array of [lower, upper) sample indexes.
+    hop_length : int, optional
+        Number of samples between successive frames.
+
+    Returns
+    -------
+    frames : ndarray
+        N x 2 array of [start, stop) frame indexes. Each clip has the same
+        number of frames that computing its MFCCs on their own would give.
+    """
+    bounds = np.asarray(bounds, dtype=int).reshape(-1, 2)
+    start = (bounds[:, 0] + hop_length // 2) // hop_length
+    stop = start + 1 + (bounds[:, 1] - bounds[:, 0]) // hop_length
+    return np.stack([start, stop], axis=1)
+
+
+def _chunk_mfcc(x, sr, t0, t1, n_mfcc, n_fft, hop_length):
+    # Computes the centered frames [t0, t1) of the whole signal, by windowing
+    # just the samples that these frames see and reflecting at the edges.
+    # These agree with one librosa call over the whole signal, except where
+    # the top_db floor of this chunk differs from that of the whole signal.
+    a = t0 * hop_length - n_fft // 2
+    b = (t1 - 1) * hop_length + n_fft - n_fft // 2
+    seg = segment.reflect_slice(x, a, b)
+    m = librosa.feature.mfcc(
+        y=seg, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length, center=False
+    )
+    return m.T
+
+
+def signal_mfcc(
+    x,
+    sr,
+    n_mfcc=13,
+    n_fft=2048,
+    hop_length=512,
+    chunk_frames=8192,
+    frames=None,
+    callback=None,
+):
+    """Computes the MFCCs of a whole signal, chunk by chunk.
+
+    Parameters
+    ----------
+    x : ndarray
+        wav data
+    sr : int
+        Sample rate
+    n_mfcc : int, optional
+        Number of MFCC components.
+    n_fft : int, optional
+        FFT window length.
+    hop_length : int, optional
+        Number of samples between successive frames.
+    chunk_frames : int, optional
+        Number of frames to compute at a time.
+    frames : ndarray or None, optional
+        N x 2 array of [start, stop) frame ranges that are needed. If given,
+        chunks that do not overlap with any of these are skipped and their
+        frames are left as NaN.
+    callback : callable, optional
+        Called with the fraction of chunks that have been computed.
+
+    Returns
+    -------
+    mfcc : ndarray
+        n_frames x n_mfcc array of MFCCs, frame t is centered on the
+        sample t * hop_length.
+    """
+    n_frames = 1 + len(x) // hop_length
+    mfcc = np.full((n_frames, n_mfcc), np.nan)
+    chunks = range(0, n_frames, chunk_frames)
+    if frames is not None and len(frames) > 0:
+        needed = np.zeros(len(chunks), dtype=bool)
+        first = np.minimum(frames[:, 0], n_frames - 1) // chunk_frames
+        last = (np.minimum(frames[:, 1], n_frames) - 1) // chunk_frames
+        for l, u in zip(first, last):
+            needed[l : u + 1] = True
+        chunks = [t0 for t0, need in zip(chunks, needed) if need]
+    elif frames is not None:
+        chunks = []
+    for status, t0 in enumerate(chunks, start=1):
+        t1 = min(t0 + chunk_frames, n_frames)
+        mfcc[t0:t1] = _chunk_mfcc(x, sr, t0, t1, n_mfcc, n_fft, hop_length)
+        if callback is not None:
+            callback(float(status) / len(chunks))
+    return mfcc
+
+
+def clip_mfccs(
+    x, sr, bounds, n_mfcc=13, mode="clip", chunk_frames=8192, callback=None
+):
+    """Computes the MFCCs of many clips of a signal.
+
+    Parameters
+    ----------
+    x : ndarray
+        wav data
+    sr : int
+        Sample rate
+    bounds : ndarray
+        N x 2 array of [lower, upper) sample indexes of the clips.
+    n_mfcc : int, optional
+        Number of MFCC components.
+    mode : str, optional
+        Either "clip", which computes the MFCCs of each clip separately, or
+        "signal", which computes the MFCCs of the signal once and returns
+        views of them. The two do not give identical features, see above.
+    chunk_frames : int, optional
+        Number of frames to compute at a time in "signal" mode.
+    callback : callable, optional
+        Called with the fraction of the work that has been completed.
+
+    Returns
+    -------
+    mfccs : list of ndarrays
+        The frames x n_mfcc MFCCs of each clip.
+    """
+    if mode not in MFCC_MODES:
+        raise ValueError(
+            "mode must be one of {0}; got {1!r}".format(
+                ", ".join(sorted(MFCC_MODES)), mode
+            )
+        )
+    if mode == "clip":
+        mfccs = []
+        for status, (l, u) in enumerate(bounds, start=1):
+            mfccs.append(librosa.feature.mfcc(y=x[l:u], sr=sr, n_mfcc=n_mfcc).T)
+            if callback is not None:
+                callback(float(status) / len(bounds))
+        return mfccs
+    frames = frame_bounds(bounds)
+    mfcc = signal_mfcc(
+        x, sr, n_mfcc=n_mfcc, chunk_frames=chunk_frames, frames=frames, callback=callback
+    )
+    return [mfcc[start:stop] for start, stop in frames]
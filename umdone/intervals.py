@@ -0,0 +1,137 @@
+"""Interval algebra on sample indexes.
+
+Intervals are N x 2 integer arrays of half-open [start, stop) sample indexes.
+Most functions here return normalized intervals, which are sorted, disjoint,
+non-empty, and do not touch each other. Selecting or removing intervals of
+audio works on these directly, in a single pass over the slices, rather than
+through a per-sample boolean mask.
+"""
+import numpy as np
+
+
+BLOCKSIZE = 1 << 20
+
+
+def as_intervals(intervals):
+    """Converts to an N x 2 int array of intervals."""
+    return np.asarray(intervals, dtype=int).reshape(-1, 2)
+
+
+def normalize(intervals, size=None):
+    """Sorts and merges overlapping or touching intervals, and drops empty
+    ones. If size is given, the intervals are clipped to [0, size).
+    """
+    intervals = as_intervals(intervals)
+    starts, stops = intervals[:, 0], intervals[:, 1]
+    if size is not None:
+        starts, stops = np.clip(starts, 0, size), np.clip(stops, 0, size)
+    nonempty = stops > starts
+    starts, stops = starts[nonempty], stops[nonempty]
+    if len(starts) == 0:
+        return np.empty((0, 2), dtype=int)
+    order = np.argsort(starts, kind="stable")
+    starts, stops = starts[order], np.maximum.accumulate(stops[order])
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = starts[1:] > stops[:-1]
+    last = np.roll(first, -1)
+    return np.stack([starts[first], stops[last]], axis=1)
+
+
+def from_inclusive(intervals, size):
+    """Normalizes [start, end] intervals whose end index is included."""
+    intervals = as_intervals(intervals)
+    return normalize(intervals + [0, 1], size=size)
+
+
+def complement(intervals, size):
+    """The normalized intervals of [0, size) that are not in intervals."""
+    intervals = normalize(intervals, size=size)
+    starts = np.concatenate([[0], intervals[:, 1]])
+    stops = np.concatenate([intervals[:, 0], [size]])
+    comp = np.stack([starts, stops], axis=1)
+    return comp[stops > starts]
+
+
+def union(*intervals):
+    """The normalized union of many interval arrays."""
+    return normalize(np.concatenate([as_intervals(i) for i in intervals]))
+
+
+def intersection(a, b):
+    """The normalized intersection of two interval arrays."""
+    a, b = normalize(a), normalize(b)
+    if len(a) == 0 or len(b) == 0:
+        return np.empty((0, 2), dtype=int)
+    # every interval of b that may overlap with each interval of a
+    lo = np.searchsorted(b[:, 1], a[:, 0], side="right")
+    hi = np.searchsorted(b[:, 0], a[:, 1], side="left")
+    counts = np.maximum(hi - lo, 0)
+    ia = np.repeat(np.arange(len(a)), counts)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    ib = np.arange(counts.sum()) - offsets + np.repeat(lo, counts)
+    starts = np.maximum(a[ia, 0], b[ib, 0])
+    stops = np.minimum(a[ia, 1], b[ib, 1])
+    return normalize(np.stack([starts, stops], axis=1))
+
+
+def difference(a, b, size):
+    """The normalized intervals of a that are not in b."""
+    return intersection(a, complement(b, size))
+
+
+def lengths(intervals):
+    """The length of each interval."""
+    intervals = as_intervals(intervals)
+    return intervals[:, 1] - intervals[:, 0]
+
+
+def to_mask(intervals, size):
+    """Returns a boolean mask of the samples in intervals, via a cumulative
+    sum of the interval edges rather than a loop over the intervals.
+    """
+    intervals = normalize(intervals, size=size)
+    edges = np.zeros(size + 1, dtype=np.int8)
+    edges[intervals[:, 0]] = 1
+    edges[intervals[:, 1]] = -1
+    return np.cumsum(edges[:-1], dtype=np.int8).astype(bool)
+
+
+def take(data, intervals):
+    """Concatenates the intervals of data, with one copy of the result."""
+    intervals = as_intervals(intervals)
+    intervals = intervals[lengths(intervals) > 0]
+    out = np.empty((int(lengths(intervals).sum()),) + data.shape[1:], data.dtype)
+    i = 0
+    for start, stop in intervals:
+        out[i : i + stop - start] = data[start:stop]
+        i += stop - start
+    return out
+
+
+def iter_take(data, intervals, blocksize=BLOCKSIZE):
+    """Yields views of the intervals of data, in blocks of at most blocksize
+    elements, without copying.
+    """
+    for start, stop in as_intervals(intervals):
+        for i in range(start, stop, blocksize):
+            yield data[i : min(i + blocksize, stop)]
+
+
+def take_range(data, intervals, lo, hi, offsets=None):
+    """Returns the samples [lo, hi) of the concatenation of the intervals of
+    data, without concatenating any other samples. The offsets of the
+    intervals in the concatenation may be given, to avoid recomputing them.
+    """
+    intervals = as_intervals(intervals)
+    if offsets is None:
+        offsets = np.concatenate([[0], np.cumsum(lengths(intervals))])
+    k0 = np.searchsorted(offsets, lo, side="right") - 1
+    k1 = np.searchsorted(offsets, hi, side="left")
+    pieces = []
+    for k in range(max(k0, 0), min(k1, len(intervals))):
+        shift = intervals[k, 0] - offsets[k]
+        start, stop = max(lo, offsets[k]), min(hi, offsets[k + 1])
+        pieces.append(data[shift + start : shift + stop])
+    if len(pieces) == 0:
+        return data[:0]
+    return np.concatenate(pieces)
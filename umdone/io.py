@@ -10,7 +10,8 @@ from umdone import dtw
 
 
 def save_mfccs(fname, mfccs, categories, distances=None):
-    """Saves MFCC data to a file.
+    """Saves MFCC data to a file. If the file already exists, the data is
+    appended to it.
 
     Parameters
     ----------
@@ -19,6 +20,10 @@ def save_mfccs(fname, mfccs, categories, distances=None):
     mfccs : list of arrays
         MFCCs
     categories :
+    distances : array or None, optional
+        The k x (n + k) distances from the k new mfccs to the n mfccs already
+        in the file followed by the new mfccs themselves, i.e. the last k rows
+        of the full distance matrix. If None, these are computed.
     """
     # data prep
     n = len(mfccs)
@@ -34,6 +39,45 @@ def save_mfccs(fname, mfccs, categories, distances=None):
         _save_mfccs_new(fname, mfccs, flat_mfccs, categories, distances, mfcc_lens)
 
 
+def _pack_rows(distances, start):
+    # packs the lower triangle of the rows of a distance matrix, starting
+    # at row index start, into a flat array
+    rows = [row[: start + i + 1] for i, row in enumerate(distances)]
+    if len(rows) == 0:
+        return np.empty(0, "f8")
+    return np.concatenate(rows)
+
+
+def _unpack_distances(packed, n):
+    dists = np.empty((n, n), "f8")
+    lower = np.tril_indices(n)
+    dists[lower] = packed
+    dists.T[lower] = packed
+    return dists
+
+
+def _create_packed_distances(f, packed):
+    # The distance matrix is stored as its packed lower triangle, row by row,
+    # in an extendable & chunked array. New rows can then just be appended.
+    f.create_earray(
+        "/",
+        "tril_distances",
+        atom=tb.Float64Atom(),
+        shape=(0,),
+        obj=packed,
+        expectedrows=max(len(packed), 1 << 16),
+    )
+
+
+def _ensure_packed_distances(f):
+    # migrates files that stored the full distance matrix as a fixed array
+    if "/tril_distances" in f:
+        return
+    dists = f.root.distances[:]
+    f.remove_node("/", "distances")
+    _create_packed_distances(f, dists[np.tril_indices(len(dists))])
+
+
 def _save_mfccs_new(fname, mfccs, flat_mfccs, categories, distances, lengths):
     if distances is None:
         distances = dtw.distance_matrix(mfccs)
@@ -41,19 +85,24 @@ def _save_mfccs_new(fname, mfccs, flat_mfccs, categories, distances, lengths):
         f.create_earray("/", "categories", shape=(0,), obj=categories)
         f.create_earray("/", "mfcc_lengths", shape=(0,), obj=lengths)
         f.create_earray("/", "mfccs", shape=(0, flat_mfccs.shape[1]), obj=flat_mfccs)
-        f.create_array("/", "distances", obj=distances)  # not extendable!
+        _create_packed_distances(f, _pack_rows(distances, 0))
 
 
 def _save_mfccs_append(fname, mfccs, flat_mfccs, categories, distances, lengths):
     if distances is None:
-        mfccs = _load_mfccs(fname) + mfccs
-        distances = dtw.distance_matrix(mfccs)
+        existing = _load_mfccs(fname)
+        n = len(existing)
+        distances = dtw.distance_matrix(existing + mfccs, start=n)
+    else:
+        # the existing mfccs are only needed to compute the distances
+        with tb.open_file(fname, "r") as f:
+            n = len(f.root.mfcc_lengths)
     with tb.open_file(fname, "a") as f:
+        _ensure_packed_distances(f)
         f.root.categories.append(categories)
         f.root.mfcc_lengths.append(lengths)
         f.root.mfccs.append(flat_mfccs)
-        f.remove_node("/", "distances")
-        f.create_array("/", "distances", obj=distances)  # not extendable!
+        f.root.tril_distances.append(_pack_rows(distances, n))
 
 
 def _load_mfccs(fname):
@@ -73,12 +122,18 @@ def _unflatten_mfccs(flat_mfccs, lens):
     return mfccs
 
 
+def _load_distances(f, n):
+    if "/tril_distances" in f:
+        return _unpack_distances(f.root.tril_distances[:], n)
+    return f.root.distances[:]
+
+
 def load_mfccs_file(fname):
     with tb.open_file(fname, "r") as f:
-        dists = f.root.distances[:]
         cats = f.root.categories[:]
         lens = f.root.mfcc_lengths[:]
         flat_mfccs = f.root.mfccs[:]
+        dists = _load_distances(f, len(lens))
     mfccs = _unflatten_mfccs(flat_mfccs, lens)
     return mfccs, dists, cats
 
@@ -0,0 +1,175 @@
+"""Condenses training data down to a set of prototypes.
+
+Every candidate clip is compared against every training clip, so inference
+cost grows with the number of labels, even though most of them are near
+duplicates. Using the stored distance matrix, a much smaller set of
+prototypes can be chosen, either as the medoids of each category or as a
+condensed nearest neighbor subset, and written out as a reduced database.
+"""
+import os
+
+import numpy as np
+
+import umdone.io
+import umdone.classifier
+
+
+METHODS = frozenset(["medoids", "cnn"])
+
+
+def medoids(distances, categories, k=8):
+    """Greedily chooses up to k medoids of each category, such that the sum of
+    the distances from each member of the category to its nearest medoid is
+    as small as possible.
+
+    Parameters
+    ----------
+    distances : ndarray
+        N x N distance matrix.
+    categories : ndarray
+        Length-N array of categories.
+    k : int, optional
+        Maximum number of medoids per category.
+
+    Returns
+    -------
+    idx : int ndarray
+        Sorted indexes of the prototypes.
+    """
+    idx = []
+    for cat in np.unique(categories):
+        members = np.flatnonzero(categories == cat)
+        d = distances[np.ix_(members, members)]
+        nearest = np.full(len(members), np.inf)
+        chosen = []
+        for _ in range(min(k, len(members))):
+            # the total cost if each candidate were added as a medoid
+            cost = np.minimum(d, nearest[:, np.newaxis]).sum(axis=0)
+            cost[chosen] = np.inf
+            best = int(np.argmin(cost))
+            chosen.append(best)
+            nearest = np.minimum(nearest, d[:, best])
+        idx.extend(members[chosen])
+    return np.sort(np.array(idx, dtype=int))
+
+
+def condensed_nearest_neighbor(distances, categories, seed=None):
+    """Chooses a condensed nearest neighbor (Hart's CNN) subset, which
+    classifies all of the training data correctly with the 1-nearest neighbor
+    rule. Clips that are at zero distance from each other but have different
+    categories cannot all be classified correctly; each of them is added to
+    the subset at most once, and ties go to the earlier member of the subset.
+
+    Parameters
+    ----------
+    distances : ndarray
+        N x N distance matrix.
+    categories : ndarray
+        Length-N array of categories.
+    seed : int or None, optional
+        Seed for the order in which the data is visited.
+
+    Returns
+    -------
+    idx : int ndarray
+        Sorted indexes of the prototypes.
+    """
+    rng = np.random.RandomState(seed)
+    order = rng.permutation(len(categories))
+    # start with one member of each category
+    _, firsts = np.unique(categories[order], return_index=True)
+    store = list(order[firsts])
+    members = set(store)
+    changed = True
+    while changed:
+        changed = False
+        for i in order:
+            if i in members:
+                continue
+            nearest = store[int(np.argmin(distances[i, store]))]
+            if categories[nearest] != categories[i]:
+                store.append(i)
+                members.add(i)
+                changed = True
+    return np.sort(np.array(store, dtype=int))
+
+
+def select(distances, categories, method="medoids", k=8, seed=None):
+    """Selects prototypes with either the "medoids" or "cnn" method."""
+    if method not in METHODS:
+        raise ValueError(
+            "method must be one of {0}; got {1!r}".format(
+                ", ".join(sorted(METHODS)), method
+            )
+        )
+    if method == "medoids":
+        return medoids(distances, categories, k=k)
+    return condensed_nearest_neighbor(distances, categories, seed=seed)
+
+
+def _accuracies(predicted, actual):
+    # category accuracy, and the accuracy of only the keep vs discard decision
+    return np.mean(predicted == actual), np.mean((predicted > 1) == (actual > 1))
+
+
+def evaluate(distances, categories, method="medoids", k=8, test_size=0.2, seed=None):
+    """Evaluates the accuracy versus speed tradeoff of prototype selection on
+    held-out labels.
+
+    Parameters
+    ----------
+    distances : ndarray
+        N x N distance matrix.
+    categories : ndarray
+        Length-N array of categories.
+    method : str, optional
+        Prototype selection method, "medoids" or "cnn".
+    k : int, optional
+        Maximum number of medoids per category.
+    test_size : float, optional
+        Fraction of the labels that are held out.
+    seed : int or None, optional
+        Seed for splitting the data.
+
+    Returns
+    -------
+    report : dict
+        Number of training and prototype clips, the speedup (the ratio of DTW
+        evaluations per candidate clip), and the category & keep/discard
+        accuracies on the held-out labels of the nearest neighbor and support
+        vector classifiers, for both the full and prototype training sets.
+    """
+    rng = np.random.RandomState(seed)
+    order = rng.permutation(len(categories))
+    n_test = max(1, int(test_size * len(categories)))
+    test, train = np.sort(order[:n_test]), np.sort(order[n_test:])
+    d_train = distances[np.ix_(train, train)]
+    protos = train[select(d_train, categories[train], method=method, k=k, seed=seed)]
+    actual = categories[test]
+    report = {
+        "method": method,
+        "n_train": len(train),
+        "n_test": len(test),
+        "n_prototypes": len(protos),
+        "speedup": len(train) / max(len(protos), 1),
+    }
+    for name, ref in [("full", train), ("prototypes", protos)]:
+        d_test = distances[np.ix_(test, ref)]
+        nn = categories[ref][np.argmin(d_test, axis=1)]
+        report[name + "_nearest"] = _accuracies(nn, actual)
+        svc = umdone.classifier.fit(distances[np.ix_(ref, ref)], categories[ref])
+        report[name + "_svc"] = _accuracies(svc.predict(d_test), actual)
+    return report
+
+
+def save(outfile, mfccs, distances, categories, idx):
+    """Writes the prototypes idx of the training data to a new database file."""
+    if os.path.isfile(outfile):
+        os.remove(outfile)
+    umdone.io.save_mfccs(
+        outfile,
+        [mfccs[i] for i in idx],
+        categories[idx],
+        distances=distances[np.ix_(idx, idx)],
+    )
+
@@ -1,38 +1,191 @@
 """Remove Umms (and similar) from audio."""
 import os
-import sys
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
 
-import librosa
 import numpy as np
-from sklearn import svm
 
+from umdone import activity
 from umdone import dtw
+from umdone import features
 
 import umdone.io
+import umdone.classifier
 from umdone import segment
 from umdone.tools import cache
 from umdone.sound import Audio
 
 
-def match(x, sr, bounds, mfccs, distances, categories):
+CLASSIFIERS = frozenset(["svc", "nearest"])
+
+
+def _clip_distances(clips, mfccs, dtw_kwargs):
+    d = np.empty((len(clips), len(mfccs)), "f8")
+    buf = dtw.scratch_buffer(max(map(len, mfccs)))
+    for i, clip_mfcc in enumerate(clips):
+        for j, mfcc in enumerate(mfccs):
+            d[i, j] = dtw.distance(clip_mfcc, mfcc, buf=buf, **dtw_kwargs)
+    return d
+
+
+def _nearest_templates(clips, index):
+    return np.array([index.nearest(clip_mfcc)[0] for clip_mfcc in clips], dtype=int)
+
+
+#
+# Parallel matching. The training mfccs are placed in shared memory once,
+# and each worker process attaches to them when it starts up, so that only
+# the candidate clips are sent along with each task.
+#
+
+_WORKER = {}
+
+
+def _share_mfccs(mfccs):
+    flat = np.concatenate(mfccs, axis=0)
+    shm = shared_memory.SharedMemory(create=True, size=max(flat.nbytes, 1))
+    shared = np.ndarray(flat.shape, dtype=flat.dtype, buffer=shm.buf)
+    shared[:] = flat
+    spec = (shm.name, flat.shape, flat.dtype.str, [len(m) for m in mfccs])
+    return shm, spec
+
+
+def _init_worker(spec, dtw_kwargs):
+    name, shape, dtype, lens = spec
+    shm = shared_memory.SharedMemory(name=name)
+    flat = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _WORKER.clear()
+    _WORKER.update(
+        shm=shm,
+        mfccs=umdone.io._unflatten_mfccs(flat, lens),
+        dtw_kwargs=dtw_kwargs,
+        index=None,
+    )
+
+
+def _worker_distances(clips):
+    return _clip_distances(clips, _WORKER["mfccs"], _WORKER["dtw_kwargs"])
+
+
+def _worker_nearest(clips):
+    if _WORKER["index"] is None:
+        _WORKER["index"] = dtw.TemplateIndex(_WORKER["mfccs"], **_WORKER["dtw_kwargs"])
+    index = _WORKER["index"]
+    index.reset_stats()
+    return _nearest_templates(clips, index), dict(index.stats)
+
+
+def _map_shards(func, clips, mfccs, dtw_kwargs, jobs):
+    # splits the clips into a few shards per worker, and returns the
+    # results of each shard in order
+    nshards = min(len(clips), 4 * jobs)
+    bounds = np.linspace(0, len(clips), nshards + 1).astype(int)
+    shards = [clips[l:u] for l, u in zip(bounds[:-1], bounds[1:])]
+    shm, spec = _share_mfccs(mfccs)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(spec, dtw_kwargs)
+        ) as executor:
+            results = list(executor.map(func, shards))
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+
+def _match_svc(clips, mfccs, distances, categories, dtw_kwargs, svc=None, jobs=1):
+    if jobs == 1 or len(clips) < 2:
+        d = _clip_distances(clips, mfccs, dtw_kwargs)
+    else:
+        d = np.concatenate(
+            _map_shards(_worker_distances, clips, mfccs, dtw_kwargs, jobs), axis=0
+        )
+    # learn stuff, unless we were given a pre-trained classifier
+    if svc is None:
+        svc = umdone.classifier.fit(distances, categories)
+    if len(clips) == 0:
+        return np.empty(0, dtype=int)
+    return svc.predict(d)
+
+
+def _match_nearest(clips, mfccs, categories, dtw_kwargs, jobs=1):
+    if jobs == 1 or len(clips) < 2:
+        index = dtw.TemplateIndex(mfccs, **dtw_kwargs)
+        js = _nearest_templates(clips, index)
+        stats = index.stats
+    else:
+        shards = _map_shards(_worker_nearest, clips, mfccs, dtw_kwargs, jobs)
+        js = np.concatenate([j for j, _ in shards])
+        stats = {}
+        for _, shard_stats in shards:
+            for key, value in shard_stats.items():
+                stats[key] = stats.get(key, 0) + value
+    return np.asarray(categories)[js], stats
+
+
+def match(
+    x,
+    sr,
+    bounds,
+    mfccs,
+    distances,
+    categories,
+    band=None,
+    band_width=0.1,
+    max_slope=2.0,
+    classifier="svc",
+    mfcc_mode="clip",
+    svc=None,
+    jobs=1,
+    stats=None,
+):
     """Finds the matches to the training data in x that is in valid the bounds.
-    Returns the matched bounds.
+    Returns the matched bounds. The band, band_width, and max_slope are the
+    DTW global path constraint, see umdone.dtw.distance().
+
+    The classifier may either be "svc", which fits a support vector classifier
+    to the distances from each clip to all of the training data, or "nearest",
+    which assigns each clip the category of its nearest training clip. The
+    latter uses lower bound pruning and so skips most DTW computations. A
+    pre-trained support vector classifier may be given as svc, in which case
+    the distances and categories are not needed.
+
+    The mfcc_mode is either "clip", to compute the MFCCs of each clip
+    separately, or "signal", to compute them for the whole signal just once,
+    see umdone.features.clip_mfccs(). It must be the mode that the training
+    mfccs were computed with.
+
+    If jobs is not 1, the clips are matched on a pool of jobs processes;
+    None means one process per core.
+
+    If stats is a dict, it is updated with the lower bound pruning statistics
+    of the "nearest" classifier, see umdone.dtw.TemplateIndex.
     """
-    # data setup
+    if classifier not in CLASSIFIERS:
+        raise ValueError(
+            "classifier must be one of {0}; got {1!r}".format(
+                ", ".join(sorted(CLASSIFIERS)), classifier
+            )
+        )
+    # make sure the clips have real size, the rest are skipped and kept
     n_mfcc = mfccs[0].shape[1]
-    d = np.empty((len(bounds), len(distances)), "f8")
-    for i, (l, u) in enumerate(bounds):
-        if (u - l) < 100:
-            # make sure the clip has real size
-            continue
-        clip = x[l:u]
-        clip_mfcc = librosa.feature.mfcc(clip, sr, n_mfcc=n_mfcc).T
-        for j, mfcc in enumerate(mfccs):
-            d[i, j] = dtw.distance(clip_mfcc, mfcc)
-    # learn stuff
-    classifier = svm.SVC(gamma=0.001)
-    classifier.fit(distances, categories)
-    results = classifier.predict(d)
+    valid = np.flatnonzero((bounds[:, 1] - bounds[:, 0]) >= 100)
+    clips = features.clip_mfccs(x, sr, bounds[valid], n_mfcc=n_mfcc, mode=mfcc_mode)
+    dtw_kwargs = dict(band=band, band_width=band_width, max_slope=max_slope)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if classifier == "nearest":
+        valid_results, nearest_stats = _match_nearest(
+            clips, mfccs, categories, dtw_kwargs, jobs=jobs
+        )
+        if stats is not None:
+            stats.update(nearest_stats)
+    else:
+        valid_results = _match_svc(
+            clips, mfccs, distances, categories, dtw_kwargs, svc=svc, jobs=jobs
+        )
+    results = np.zeros(len(bounds), dtype=int)
+    results[valid] = valid_results
     # words = 0 and ambiguous = 1, so we want to discard cases > 1,
     # ie umm/like/etc = 2 and non-words = 3
     matches = bounds[results > 1]
@@ -40,24 +193,85 @@ def match(x, sr, bounds, mfccs, distances, categories):
 
 
 def _remove_umms(
-    audio, mfccs, distances, categories, window_length=0.05, noise_threshold=0.01
+    audio,
+    mfccs,
+    distances,
+    categories,
+    window_length=0.05,
+    noise_threshold=0.01,
+    hysteresis=0.0,
+    min_gap=0.0,
+    band=None,
+    band_width=0.1,
+    max_slope=2.0,
+    classifier="svc",
+    mfcc_mode="clip",
+    svc=None,
+    jobs=1,
+    stats=None,
 ):
     x, sr = audio.data, audio.sr
-    bounds = segment.boundaries(
-        x, sr, window_length=window_length, threshold=noise_threshold
+    bounds = activity.boundaries(
+        audio,
+        window_length=window_length,
+        threshold=noise_threshold,
+        hysteresis=hysteresis,
+        min_gap=min_gap,
     )
-    matches = match(x, sr, bounds, mfccs, distances, categories)
-    y = segment.remove_slices(x.T, matches)
-    out = Audio(y, sr)
+    matches = match(
+        x,
+        sr,
+        bounds,
+        mfccs,
+        distances,
+        categories,
+        band=band,
+        band_width=band_width,
+        max_slope=max_slope,
+        classifier=classifier,
+        mfcc_mode=mfcc_mode,
+        svc=svc,
+        jobs=jobs,
+        stats=stats,
+    )
+    blocks = segment.iter_remove_slices(x, matches)
+    out = Audio.from_blocks(blocks, sr, dtype=x.dtype)
     return out
 
 
-@cache
+# the number of workers does not change the result, so it is not part of the key
+@cache(ignore=["jobs"])
 def _remove_umms_cacheable(
-    audio_hash, dbfiles, window_length=0.05, noise_threshold=0.01
+    audio_hash,
+    dbfiles,
+    window_length=0.05,
+    noise_threshold=0.01,
+    hysteresis=0.0,
+    min_gap=0.0,
+    band=None,
+    band_width=0.1,
+    max_slope=2.0,
+    classifier="svc",
+    mfcc_mode="clip",
+    jobs=1,
 ):
     audio = Audio.from_hash(audio_hash)
-    mfccs, distances, categories = umdone.io.load(dbfiles)
+    if isinstance(dbfiles, str):
+        dbfiles = [dbfiles]
+    dtw_kwargs = dict(band=band, band_width=band_width, max_slope=max_slope)
+    svc = None
+    stats = {}
+    if classifier == "svc":
+        svc = umdone.classifier.load(dbfiles, **dtw_kwargs)
+        stats["pretrained"] = svc is not None
+    if svc is None:
+        mfccs, distances, categories = umdone.classifier.training_data(
+            dbfiles, **dtw_kwargs
+        )
+    else:
+        # the pre-trained classifier only needs the mfccs for its features
+        mfccs = [m for dbfile in dbfiles for m in umdone.io._load_mfccs(dbfile)]
+        distances = categories = None
     out = _remove_umms(
         audio,
         mfccs,
@@ -65,8 +279,18 @@ def _remove_umms_cacheable(
         categories,
         window_length=window_length,
         noise_threshold=noise_threshold,
+        hysteresis=hysteresis,
+        min_gap=min_gap,
+        band=band,
+        band_width=band_width,
+        max_slope=max_slope,
+        classifier=classifier,
+        mfcc_mode=mfcc_mode,
+        svc=svc,
+        jobs=jobs,
+        stats=stats,
     )
-    return out.hash_str()
+    return out.hash_str(), stats
 
 
 def remove_umms(
@@ -77,6 +301,15 @@ def remove_umms(
     categories=None,
     window_length=0.05,
     noise_threshold=0.01,
+    hysteresis=0.0,
+    min_gap=0.0,
+    band=None,
+    band_width=0.1,
+    max_slope=2.0,
+    classifier="svc",
+    mfcc_mode="clip",
+    jobs=1,
+    stats=None,
 ):
     """Filters out umms and other unwanted clips from audio using support vector
     classification.
@@ -87,7 +320,9 @@ def remove_umms(
         Audio instance, or a string loadable as such
     dbfiles : str, list of str, or None, optional
         The training database files to load. If this is None, mfccs, distances,
-        and categories must be supplied.
+        and categories must be supplied. If a pre-trained classifier has been
+        built for these files, see umdone.classifier.build(), it is used
+        rather than fitting a new one.
     mfccs : list of ndarrays or None, optional
         MFCCs, if None, dbfiles must not be None,
     distances : float ndarray or None, optional
@@ -98,6 +333,33 @@ def remove_umms(
         Word boundary window length
     noise_threshold : float, optional
         Noise threshold on words vs quiet
+    hysteresis : float, optional
+        Fraction of the noise threshold by which sound must fall below it to
+        end a word.
+    min_gap : float, optional
+        Words separated by less quiet than this (in sec) are merged.
+    band : str or None, optional
+        DTW global path constraint, "sakoe-chiba", "itakura", or None.
+    band_width : float, optional
+        Radius of the Sakoe-Chiba band, as a fraction of the clip length.
+    max_slope : float, optional
+        Maximum slope of the Itakura parallelogram.
+    classifier : str, optional
+        Either "svc" for support vector classification or "nearest" for
+        nearest neighbor classification with lower bound pruning.
+    mfcc_mode : str, optional
+        Either "clip" to compute the MFCCs of each clip separately, or
+        "signal" to compute them for the whole audio once. This must match
+        the mode that the training databases were built with.
+    jobs : int or None, optional
+        Number of worker processes to match clips with, None means one per
+        core.
+    stats : dict or None, optional
+        If given, this is updated with statistics of the matching: the lower
+        bound pruning counts of the "nearest" classifier, see
+        umdone.dtw.TemplateIndex, and whether a pre-trained classifier was
+        used, as "pretrained". For cached results, these describe the run that
+        first computed them.
 
     Returns
     -------
@@ -110,12 +372,22 @@ def remove_umms(
     # figure out which command to call.
     if dbfiles is not None:
         # yes, we are in a cacheable situation
-        out_hash = _remove_umms_cacheable(
+        out_hash, run_stats = _remove_umms_cacheable(
             audio.hash_str(),
             dbfiles,
             window_length=window_length,
             noise_threshold=noise_threshold,
+            hysteresis=hysteresis,
+            min_gap=min_gap,
+            band=band,
+            band_width=band_width,
+            max_slope=max_slope,
+            classifier=classifier,
+            mfcc_mode=mfcc_mode,
+            jobs=jobs,
         )
+        if stats is not None:
+            stats.update(run_stats)
         out = Audio.from_hash(out_hash)
     elif mfccs is not None and distances is not None and categories is not None:
         # just do the comuptation
@@ -126,6 +398,15 @@ def remove_umms(
             categories,
             window_length=window_length,
             noise_threshold=noise_threshold,
+            hysteresis=hysteresis,
+            min_gap=min_gap,
+            band=band,
+            band_width=band_width,
+            max_slope=max_slope,
+            classifier=classifier,
+            mfcc_mode=mfcc_mode,
+            jobs=jobs,
+            stats=stats,
         )
     else:
         raise ValueError(
@@ -1,15 +1,31 @@
 """Segements long audio into clips when someone is speaking."""
 import numpy as np
 
+import librosa
 
-def boundaries(x, sr, window_length=0.05, threshold=0.01):
+from umdone import intervals
+from umdone.intervals import BLOCKSIZE
+
+
+def boundaries(
+    x,
+    sr,
+    window_length=0.05,
+    threshold=0.01,
+    rms=None,
+    hysteresis=0.0,
+    min_gap=0.0,
+    blocksize=BLOCKSIZE,
+):
     """Computes the indexes of a wav between which some one is speaking, ie
-    there is meaningful sound other than noise.
+    there is meaningful sound other than noise. The window RMS is computed and
+    scanned block by block, so that the memory used does not depend on the
+    length of the audio.
 
     Parameters
     ----------
     x : ndarray
-        wav data
+        wav data, may be memory-mapped
     sr : int
         Sample rate
     window_length : num, optional
@@ -17,6 +33,17 @@ def boundaries(x, sr, window_length=0.05, threshold=0.01):
     threshold : float
         The noise threshold, below which a window is considered noise and above
         which the window is considered valuable sound.
+    rms : ndarray or None, optional
+        The precomputed RMS of each window, such as from umdone.activity.
+    hysteresis : float, optional
+        Once the RMS rises above the threshold, the sound only ends when the
+        RMS falls below (1 - hysteresis) * threshold, so that sound which
+        hovers around the threshold is not split into many short clips.
+    min_gap : float, optional
+        Sounds that are separated by less than this many seconds of noise
+        are merged into a single clip.
+    blocksize : int, optional
+        Number of samples to process at a time.
 
     Returns
     -------
@@ -24,27 +51,183 @@ def boundaries(x, sr, window_length=0.05, threshold=0.01):
         N x 2 array of indexes of wav where there is sound above the threshold level.
     """
     window_size = int(sr * window_length)
-    # y = window x
-    y = x[: -(len(x) % window_size)]
-    y.shape = (len(y) // window_size), window_size
-    rms = np.sqrt((y ** 2).sum(axis=1) / window_size)  # RMS of each window
-    idx = np.argwhere(rms > 0.01).flat  # fancy index of window boundaries
-    window_bounds = np.argwhere((idx[1:] - idx[:-1]) > 1).flatten()
-    window_lower = idx[window_bounds + 1]
-    window_upper = idx[window_bounds]
-    bounds = np.array([window_lower[:-1], window_upper[1:]]).T * window_size
-    return bounds
-
-
-def remove_slices(arr, slices):
-    """Removes slices from an array. Assumes that slices are sorted."""
-    if len(slices) == 0:
-        return arr
-    elif len(slices) == 1:
-        return np.concatenate([arr[: slices[0][0]], arr[slices[0][1] :]])
+    if rms is None:
+        rms_blocks = iter_window_rms(x, window_size, blocksize=blocksize)
     else:
-        views = [arr[: slices[0][0]]]
-        for (_, l), (u, _) in zip(slices[:-1], slices[1:]):
-            views.append(arr[l:u])
-        views.append(arr[slices[-1][1] :])
-        return np.concatenate(views)
+        step = max(blocksize // window_size, 1)
+        rms_blocks = (rms[i : i + step] for i in range(0, len(rms), step))
+    release = threshold * (1.0 - hysteresis)
+    runs = iter_hysteresis_runs(rms_blocks, threshold, release)
+    runs = iter_merge_runs(runs, int(np.ceil(min_gap * sr / window_size)))
+    # the first and last sounds are not bounded by noise on both sides, and
+    # each clip stops at the start of its last window.
+    runs = np.array(list(runs), dtype=int).reshape(-1, 2)[1:-1]
+    return (runs - [0, 1]) * window_size
+
+
+def iter_window_rms(x, window_size, blocksize=BLOCKSIZE):
+    """Yields the RMS of the whole, non-overlapping windows of a signal, block
+    by block. The sum of squares of each window is taken with einsum(), so
+    the squares of the samples are never held in memory.
+    """
+    n_windows = len(x) // window_size
+    step = max(blocksize // window_size, 1)
+    for w0 in range(0, n_windows, step):
+        w1 = min(w0 + step, n_windows)
+        seg = np.asarray(x[w0 * window_size : w1 * window_size])
+        seg = seg.reshape(w1 - w0, window_size)
+        yield np.sqrt(np.einsum("ij,ij->i", seg, seg) / window_size)
+
+
+def iter_hysteresis_runs(rms_blocks, threshold, release):
+    """Yields the [start, stop) window indexes of the runs of sound from blocks
+    of window RMS. A run starts at a window above the threshold, and stops at
+    the next window that is not above the release level, which is at most
+    the threshold. Runs that span blocks are yielded once they stop.
+    """
+    offset = 0
+    # the start of the run above the release level at the end of the last
+    # block, and the index where it rose above the threshold, or None
+    open_start = open_onset = None
+    for r in rms_blocks:
+        n = len(r)
+        if n == 0:
+            continue
+        above = np.concatenate([[False], r > release, [False]])
+        edges = np.flatnonzero(above[1:] != above[:-1])
+        starts, stops = edges[::2], edges[1::2]
+        loud = np.flatnonzero(r > threshold)
+        # the first loud window of each run above the release level, or -1
+        k = np.searchsorted(loud, starts)
+        onsets = np.append(loud, n)[k]
+        onsets = np.where(onsets < stops, onsets + offset, -1)
+        starts, stops = starts + offset, stops + offset
+        if open_start is not None:
+            if len(starts) and starts[0] == offset:
+                starts[0] = open_start
+                if open_onset is not None:
+                    onsets[0] = open_onset
+            elif open_onset is not None:
+                yield open_onset, offset
+        offset += n
+        open_start = open_onset = None
+        if len(stops) and stops[-1] == offset:
+            open_start = starts[-1]
+            open_onset = None if onsets[-1] < 0 else onsets[-1]
+            starts, stops, onsets = starts[:-1], stops[:-1], onsets[:-1]
+        for onset, stop in zip(onsets[onsets >= 0], stops[onsets >= 0]):
+            yield int(onset), int(stop)
+    if open_onset is not None:
+        yield int(open_onset), offset
+
+
+def iter_merge_runs(runs, min_gap):
+    """Merges consecutive [start, stop) runs that are separated by fewer than
+    min_gap indexes.
+    """
+    last = None
+    for start, stop in runs:
+        if last is not None and start - last[1] < min_gap:
+            last = (last[0], stop)
+            continue
+        if last is not None:
+            yield last
+        last = (start, stop)
+    if last is not None:
+        yield last
+
+
+def reflect_range(get, n, a, b):
+    """Returns the samples [a, b) of a length-n signal that is reflected at
+    its edges, as np.pad(..., mode="reflect") gives them, where get(lo, hi)
+    returns the samples [lo, hi) of the signal. Only the samples that are
+    needed are read.
+    """
+    left, right = max(-a, 0), max(b - n, 0)
+    if left >= n or right >= n - 1 or b <= 0 or a >= n:
+        # the reflection wraps around, or [a, b) is all outside the signal
+        x = np.asarray(get(0, n))
+        width = [(left, right)] + [(0, 0)] * (x.ndim - 1)
+        return np.pad(x, width, mode="reflect")[a + left : b + left]
+    seg = np.asarray(get(max(a, 0), min(b, n)))
+    if left == 0 and right == 0:
+        return seg
+    parts = [np.asarray(get(1, left + 1))[::-1], seg]
+    parts.append(np.asarray(get(n - 1 - right, n - 1))[::-1])
+    return np.concatenate(parts)
+
+
+def reflect_slice(x, a, b):
+    """Returns the samples [a, b) of a signal that is reflected at its edges,
+    see reflect_range().
+    """
+    return reflect_range(lambda lo, hi: x[lo:hi], len(x), a, b)
+
+
+def frame_rms(x, frame_length=2048, hop_length=512, center=True, chunk_frames=8192):
+    """Computes the RMS of each frame of a signal, chunk by chunk, such that
+    only a chunk of the signal is in memory at once. This gives the same
+    values as librosa.feature.rms(y=x, center=center), which reflects the
+    signal at its edges.
+
+    Parameters
+    ----------
+    x : ndarray
+        wav data, may be memory-mapped
+    frame_length : int, optional
+        The number of samples per frame.
+    hop_length : int, optional
+        The number of samples between frames.
+    center : bool, optional
+        Whether frame t is centered on sample t * hop_length, with the signal
+        reflected at its edges, or starts at it.
+    chunk_frames : int, optional
+        Number of frames to compute at a time.
+
+    Returns
+    -------
+    rms : ndarray
+        The RMS of each frame.
+    """
+    n = len(x)
+    half = frame_length // 2 if center else 0
+    n_frames = max(1 + (n + 2 * half - frame_length) // hop_length, 0)
+    rms = np.empty(n_frames, dtype=x.dtype)
+    for t0 in range(0, n_frames, chunk_frames):
+        t1 = min(t0 + chunk_frames, n_frames)
+        a = t0 * hop_length - half
+        b = (t1 - 1) * hop_length + frame_length - half
+        seg = reflect_slice(x, a, b)
+        r = librosa.feature.rms(
+            y=seg, frame_length=frame_length, hop_length=hop_length, center=False
+        )
+        rms[t0:t1] = r[0]
+    return rms
+
+
+def rms_intervals(rms, n, top_db=60, hop_length=512):
+    """Computes the non-silent [start, end) sample intervals of a signal of
+    length n from the RMS of its centered frames, as librosa.effects.split()
+    does.
+    """
+    if len(rms) == 0:
+        return np.empty((0, 2), dtype=int)
+    db = librosa.amplitude_to_db(rms, ref=np.max(rms), top_db=None)
+    non_silent = db > -top_db
+    edges = [np.flatnonzero(np.diff(non_silent.astype(int))) + 1]
+    if non_silent[0]:
+        edges.insert(0, np.array([0]))
+    if non_silent[-1]:
+        edges.append(np.array([len(non_silent)]))
+    edges = np.concatenate(edges) * hop_length
+    edges = np.minimum(edges, n)
+    return edges.reshape((-1, 2))
+
+
+def iter_remove_slices(arr, slices, blocksize=BLOCKSIZE):
+    """Yields the blocks of an array that remain after removing slices from it,
+    without copying.
+    """
+    kept = intervals.complement(slices, len(arr))
+    return intervals.iter_take(arr, kept, blocksize=blocksize)
+
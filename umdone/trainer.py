@@ -6,7 +6,6 @@ import json
 from argparse import ArgumentParser
 
 import urwid
-import librosa
 import numpy as np
 import tables as tb
 
@@ -15,6 +14,7 @@ import sounddevice as sd
 import umdone.io
 from umdone import cli
 from umdone import dtw
+from umdone import features
 from umdone import sound
 from umdone import segment
 from umdone.tools import UMDONE_CONFIG_DIR
@@ -35,32 +35,64 @@ class TrainerModel(BaseAppModel):
     default_settings = {"device": None, "current_segments": {}}
     settings_file = os.path.join(UMDONE_CONFIG_DIR, "trainer.json")
 
-    def __init__(self, audio, window_length=0.05, threshold=0.01, n_mfcc=13, device=-1):
+    def __init__(
+        self,
+        audio,
+        window_length=0.05,
+        threshold=0.01,
+        n_mfcc=13,
+        device=-1,
+        band=None,
+        band_width=0.1,
+        max_slope=2.0,
+        jobs=1,
+        mfcc_mode="clip",
+        **kwargs,
+    ):
         super().__init__(
-            audio, window_length=window_length, threshold=threshold, device=device
+            audio,
+            window_length=window_length,
+            threshold=threshold,
+            device=device,
+            **kwargs,
         )
         self.n_mfcc = n_mfcc
+        self.band = band
+        self.band_width = band_width
+        self.max_slope = max_slope
+        self.jobs = jobs
+        self.mfcc_mode = mfcc_mode
 
     def compute_mfccs(self, callback=None):
-        sr = self.sr
-        n_mfcc = self.n_mfcc
-        n = len(self.categories)
-        self.mfccs = mfccs = []
+        # shares its feature extraction with umdone.remove_ums.match()
         order = self.segement_order()
-        for status, seg in enumerate(order, start=1):
-            if callback is not None:
-                callback(float(status) / n)
-            l, u = self.bounds[seg]
-            clip = self.raw[l:u]
-            mfcc = librosa.feature.mfcc(clip, sr, n_mfcc=n_mfcc).T
-            mfccs.append(mfcc)
+        self.mfccs = mfccs = features.clip_mfccs(
+            self.raw,
+            self.sr,
+            self.bounds[order],
+            n_mfcc=self.n_mfcc,
+            mode=self.mfcc_mode,
+            callback=callback,
+        )
         return mfccs
 
     def compute_distances(self, outfile, callback=None):
+        # only the distances from the new mfccs need to be computed
         mfccs = self.mfccs
+        start = 0
         if os.path.isfile(outfile):
-            mfccs = umdone.io._load_mfccs(outfile) + mfccs
-        self.distances = dtw.distance_matrix(mfccs, callback=callback)
+            existing = umdone.io._load_mfccs(outfile)
+            start = len(existing)
+            mfccs = existing + mfccs
+        self.distances = dtw.distance_matrix(
+            mfccs,
+            callback=callback,
+            start=start,
+            band=self.band,
+            band_width=self.band_width,
+            max_slope=self.max_slope,
+            jobs=self.jobs,
+        )
         return self.distances
 
     def save(self):
@@ -116,7 +148,12 @@ def add_arguments(parser):
     cli.add_output(parser)
     cli.add_window_length(parser)
     cli.add_noise_threshold(parser)
+    cli.add_hysteresis(parser)
+    cli.add_min_gap(parser)
     cli.add_n_mfcc(parser)
+    cli.add_band(parser)
+    cli.add_jobs(parser)
+    cli.add_mfcc_mode(parser)
     cli.add_input(parser)
 
 
@@ -133,7 +170,14 @@ def main(ns=None, args=None):
         ns.output,
         window_length=ns.window_length,
         noise_threshold=ns.noise_threshold,
+        hysteresis=ns.hysteresis,
+        min_gap=ns.min_gap,
         n_mfcc=ns.n_mfcc,
+        band=ns.band,
+        band_width=ns.band_width,
+        max_slope=ns.max_slope,
+        jobs=ns.jobs or None,
+        mfcc_mode=ns.mfcc_mode,
     ).main()
 
 